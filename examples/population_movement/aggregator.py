@@ -5,11 +5,70 @@ Aggregation Engine Module
 Aggregates individual journeys to find shared journey segments and population movement patterns.
 """
 
-from typing import Dict, List, Tuple, Set, Optional
+from typing import Dict, List, Tuple, Optional
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import numpy as np
 from journey_tracker import Journey
 
+try:
+    import pandas as pd
+except ImportError:  # Optional: fall back to the pure Python aggregation path
+    pd = None
+
+try:
+    from numba import njit
+except ImportError:  # Optional: the compiled kernel is skipped without numba
+    njit = None
+
+# Largest cell count for which the kernel uses dense (cells x cells) accumulators
+_KERNEL_MAX_CELLS = 1024
+
+_INT64_MIN = np.iinfo(np.int64).min
+_INT64_MAX = np.iinfo(np.int64).max
+
+# Number of set bits for every byte value, used by _Bitset.__len__
+_POPCOUNT = bytes(bin(i).count("1") for i in range(256))
+
+
+class _Bitset:
+    """Minimal bytearray-backed bitset of interned subscriber IDs (pyroaring fallback)."""
+    
+    __slots__ = ("_bits",)
+    
+    def __init__(self, ids=()):
+        self._bits = bytearray()
+        self.update(ids)
+    
+    def add(self, i: int):
+        byte = i >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        self._bits[byte] |= 1 << (i & 7)
+    
+    def update(self, ids):
+        for i in ids:
+            self.add(i)
+    
+    def __contains__(self, i: int) -> bool:
+        byte = i >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (i & 7)))
+    
+    def __iter__(self):
+        for byte, value in enumerate(self._bits):
+            for bit in range(8):
+                if value & (1 << bit):
+                    yield (byte << 3) | bit
+    
+    def __len__(self) -> int:
+        return sum(self._bits.translate(_POPCOUNT))
+
+
+try:
+    from pyroaring import BitMap as SubscriberSet
+except ImportError:  # Optional: fall back to the bytearray bitset
+    SubscriberSet = _Bitset
+
 
 @dataclass
 class SegmentFlow:
@@ -28,9 +87,202 @@ class CellFlow:
     cell_id: str
     total_entries: int
     total_exits: int
-    unique_subscribers: Set[str]
-    entry_segments: List[Tuple[str, str]]  # (from_cell, to_cell) tuples
-    exit_segments: List[Tuple[str, str]]  # (from_cell, to_cell) tuples
+    unique_subscribers: SubscriberSet  # Interned subscriber IDs
+    entry_counts: Dict[int, int]  # Segment key -> number of entries via that segment
+    exit_counts: Dict[int, int]  # Segment key -> number of exits via that segment
+    _cells: List[str] = field(default_factory=list, repr=False, compare=False)  # Cell code -> cell ID
+    
+    def _segments(self, counts: Dict[int, int]) -> List[Tuple[str, str]]:
+        cells = self._cells
+        return [(cells[key >> 32], cells[key & 0xFFFFFFFF])
+                for key, count in counts.items() for _ in range(count)]
+    
+    @property
+    def entry_segments(self) -> List[Tuple[str, str]]:
+        """(from_cell, to_cell) tuple for every entry, materialized on demand."""
+        return self._segments(self.entry_counts)
+    
+    @property
+    def exit_segments(self) -> List[Tuple[str, str]]:
+        """(from_cell, to_cell) tuple for every exit, materialized on demand."""
+        return self._segments(self.exit_counts)
+
+
+class _SegmentTable:
+    """
+    Structure-of-arrays storage for segment flows.
+    
+    Each segment is one row across parallel NumPy columns, addressed by its packed
+    int64 segment key (see JourneyAggregator._intern). SegmentFlow objects are
+    built on demand as read-only snapshots.
+    """
+    
+    _INITIAL_CAPACITY = 1024
+    
+    def __init__(self, cells: List[str]):
+        self._cells = cells  # Cell code -> cell ID, shared with the aggregator
+        self._row_of: Dict[int, int] = {}  # segment key -> row index
+        self._row_subscribers: Dict[int, SubscriberSet] = {}  # row -> subscriber IDs, for add()
+        self._size = 0
+        self._allocate(self._INITIAL_CAPACITY)
+    
+    def _allocate(self, capacity: int):
+        self._from_codes = np.empty(capacity, dtype=np.int32)
+        self._to_codes = np.empty(capacity, dtype=np.int32)
+        self._journey_count = np.empty(capacity, dtype=np.int64)
+        self._first_seen = np.empty(capacity, dtype=np.int64)
+        self._last_seen = np.empty(capacity, dtype=np.int64)
+        self._subscriber_count = np.empty(capacity, dtype=np.int64)
+    
+    def _reserve(self, needed: int):
+        """Grow all columns (doubling) so at least `needed` rows fit."""
+        capacity = len(self._journey_count)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._from_codes = np.resize(self._from_codes, capacity)
+        self._to_codes = np.resize(self._to_codes, capacity)
+        self._journey_count = np.resize(self._journey_count, capacity)
+        self._first_seen = np.resize(self._first_seen, capacity)
+        self._last_seen = np.resize(self._last_seen, capacity)
+        self._subscriber_count = np.resize(self._subscriber_count, capacity)
+    
+    def extend(self, keys, journey_count, subscriber_count, first_seen, last_seen):
+        """Append one row per unique segment key; all columns are copied in bulk."""
+        keys = np.asarray(keys, dtype=np.int64)
+        start = self._size
+        stop = start + len(keys)
+        self._reserve(stop)
+        
+        self._row_of.update(zip(keys.tolist(), range(start, stop)))
+        self._from_codes[start:stop] = keys >> 32
+        self._to_codes[start:stop] = keys & 0xFFFFFFFF
+        self._journey_count[start:stop] = journey_count
+        self._subscriber_count[start:stop] = subscriber_count
+        self._first_seen[start:stop] = first_seen
+        self._last_seen[start:stop] = last_seen
+        self._size = stop
+    
+    def add(self, key: int, sub_id: int, first_seen: int, last_seen: int):
+        """
+        Count one journey on a segment, appending its row on first sight.
+        
+        Rows appended by extend() keep no subscriber sets, so they cannot be added to.
+        """
+        row = self._row_of.get(key)
+        if row is not None:
+            subscribers = self._row_subscribers[row]
+        else:
+            row = self._size
+            self._reserve(row + 1)
+            self._row_of[key] = row
+            self._from_codes[row] = key >> 32
+            self._to_codes[row] = key & 0xFFFFFFFF
+            self._journey_count[row] = 0
+            self._subscriber_count[row] = 0
+            self._first_seen[row] = first_seen
+            self._last_seen[row] = last_seen
+            subscribers = self._row_subscribers[row] = SubscriberSet()
+            self._size = row + 1
+        
+        self._journey_count[row] += 1
+        if sub_id not in subscribers:
+            subscribers.add(sub_id)
+            self._subscriber_count[row] += 1
+        if first_seen < self._first_seen[row]:
+            self._first_seen[row] = first_seen
+        if last_seen > self._last_seen[row]:
+            self._last_seen[row] = last_seen
+    
+    @property
+    def tracks_subscribers(self) -> bool:
+        """Whether every row keeps the subscriber set add() needs (false once extend() was used)."""
+        return len(self._row_subscribers) == self._size
+    
+    @property
+    def journey_count(self) -> np.ndarray:
+        """Journey counts for all rows (view, not a copy)."""
+        return self._journey_count[:self._size]
+    
+    @property
+    def keys(self) -> np.ndarray:
+        """Packed segment keys for all rows."""
+        n = self._size
+        return (self._from_codes[:n].astype(np.int64) << 32) | self._to_codes[:n]
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __contains__(self, key: int) -> bool:
+        return key in self._row_of
+    
+    def __getitem__(self, row: int) -> SegmentFlow:
+        return SegmentFlow(
+            from_cell=self._cells[self._from_codes[row]],
+            to_cell=self._cells[self._to_codes[row]],
+            journey_count=int(self._journey_count[row]),
+            subscriber_count=int(self._subscriber_count[row]),
+            first_seen=int(self._first_seen[row]),
+            last_seen=int(self._last_seen[row])
+        )
+    
+    def get(self, key: int) -> Optional[SegmentFlow]:
+        row = self._row_of.get(key)
+        return None if row is None else self[row]
+    
+    def values(self) -> List[SegmentFlow]:
+        return [self[row] for row in range(self._size)]
+
+
+def _aggregate_kernel(from_ids, to_ids, start_ts, end_ts, n_cells):
+    """
+    Accumulate per-segment journey counts and first/last timestamps.
+    
+    Segments are addressed as [from_id, to_id] in dense matrices, so no hashing
+    is needed. first_row records the first input row of each segment, which lets
+    the caller keep first-seen ordering.
+    """
+    counts = np.zeros((n_cells, n_cells), dtype=np.int64)
+    first_seen = np.full((n_cells, n_cells), _INT64_MAX, dtype=np.int64)
+    last_seen = np.full((n_cells, n_cells), _INT64_MIN, dtype=np.int64)
+    first_row = np.full((n_cells, n_cells), -1, dtype=np.int64)
+    for i in range(len(from_ids)):
+        f = from_ids[i]
+        t = to_ids[i]
+        if counts[f, t] == 0:
+            first_row[f, t] = i
+        counts[f, t] += 1
+        if start_ts[i] < first_seen[f, t]:
+            first_seen[f, t] = start_ts[i]
+        if end_ts[i] > last_seen[f, t]:
+            last_seen[f, t] = end_ts[i]
+    return counts, first_seen, last_seen, first_row
+
+
+if njit is not None:
+    # Eagerly compiled for the int64 columns built by _array_aggregate
+    _aggregate_kernel = njit(
+        "Tuple((int64[:, :], int64[:, :], int64[:, :], int64[:, :]))"
+        "(int64[:], int64[:], int64[:], int64[:], int64)",
+        cache=True, parallel=False
+    )(_aggregate_kernel)
+
+
+def _distinct(values: np.ndarray) -> np.ndarray:
+    """
+    Sorted distinct values of an int64 array.
+    
+    Sorts and drops repeats instead of calling np.unique, whose default hash-based
+    path in NumPy 2.x is many times slower on these columns.
+    """
+    values = np.sort(values)
+    if len(values) > 1:
+        keep = np.empty(len(values), dtype=bool)
+        keep[0] = True
+        np.not_equal(values[1:], values[:-1], out=keep[1:])
+        values = values[keep]
+    return values
 
 
 class JourneyAggregator:
@@ -38,9 +290,12 @@ class JourneyAggregator:
     
     def __init__(self):
         """Initialize the aggregator."""
-        self.segment_flows: Dict[Tuple[str, str], SegmentFlow] = {}
+        self._cell_id_pool: Dict[str, int] = {}  # cell_id -> small int code
+        self._cells: List[str] = []  # code -> cell_id
+        self.segment_flows = _SegmentTable(self._cells)
         self.cell_flows: Dict[str, CellFlow] = {}
-        self.journey_segments: List[Tuple[str, str]] = []  # All segments from all journeys
+        self._total_segment_count = 0  # Segments across all journeys, including repeats
+        self._sub_id: Dict[str, int] = {}  # subscriber_key -> dense subscriber ID
     
     def aggregate_journeys(self, journeys: List[Journey]):
         """
@@ -49,89 +304,374 @@ class JourneyAggregator:
         Args:
             journeys: List of Journey objects to aggregate
         """
-        # Reset state
-        self.segment_flows.clear()
+        self._reset()
+        
+        if njit is not None or pd is not None:
+            self._array_aggregate(journeys)
+        else:
+            self._python_aggregate(journeys)
+    
+    def ingest_journey(self, journey: Journey):
+        """
+        Add one completed journey to the results built by earlier ingest_journey calls.
+        
+        Streaming counterpart of aggregate_journeys, suitable as a JourneyTracker
+        on_journey_complete hook so completed journeys need not be kept.
+        
+        Args:
+            journey: Completed Journey object
+        
+        Raises:
+            ValueError: If the current results were built by aggregate_journeys
+        """
+        if not self.segment_flows.tracks_subscribers:
+            raise ValueError("ingest_journey cannot add to results built by aggregate_journeys")
+        sub_id = self._intern_subscriber(journey.subscriber_key)
+        start_time = journey.start_time
+        end_time = journey.end_time
+        intern = self._intern
+        add_segment = self.segment_flows.add
+        update_cell_flow = self._update_cell_flow
+        
+        for from_cell, to_cell in journey.iter_segments():
+            # Intern to_cell first so cell codes follow first-touch order
+            to_code = intern(to_cell)
+            key = (intern(from_cell) << 32) | to_code
+            add_segment(key, sub_id, start_time, end_time)
+            update_cell_flow(to_cell, key, sub_id, True)
+            update_cell_flow(from_cell, key, sub_id, False)
+            self._total_segment_count += 1
+    
+    def _reset(self):
+        """Clear all aggregated state."""
+        # Fresh code tables: flows handed out earlier keep decoding against the old ones
+        self._cell_id_pool = {}
+        self._cells = []
+        self.segment_flows = _SegmentTable(self._cells)
         self.cell_flows.clear()
-        self.journey_segments.clear()
+        self._total_segment_count = 0
+        self._sub_id.clear()
+    
+    def _intern(self, cell_id: str) -> int:
+        """
+        Map a cell ID to a small integer code, assigning one on first sight.
+        
+        A segment (from, to) is keyed by the single int64 (from_code << 32) | to_code.
+        """
+        code = self._cell_id_pool.get(cell_id)
+        if code is None:
+            code = len(self._cells)
+            self._cell_id_pool[cell_id] = code
+            self._cells.append(cell_id)
+        return code
+    
+    def _key_to_cells(self, key: int) -> Tuple[str, str]:
+        """Turn a packed segment key back into its (from_cell, to_cell) pair."""
+        return (self._cells[key >> 32], self._cells[key & 0xFFFFFFFF])
+    
+    def _intern_subscriber(self, subscriber_key: str) -> int:
+        """Map a subscriber key to a dense integer ID, assigning one on first sight."""
+        sub_id = self._sub_id.get(subscriber_key)
+        if sub_id is None:
+            sub_id = len(self._sub_id)
+            self._sub_id[subscriber_key] = sub_id
+        return sub_id
+    
+    def _array_aggregate(self, journeys: List[Journey]):
+        """
+        Aggregate journeys as flat integer arrays.
+        
+        Segment reductions run in the numba kernel when it is available and the
+        cell count is small enough, otherwise in a pandas groupby.
+        """
+        if len({id(journey.cell_id_table) for journey in journeys}) == 1:
+            columns = self._flatten_cell_codes(journeys)
+        else:
+            columns = self._flatten_segments(journeys)
+        from_arr, to_arr, sub_arr, start_arr, end_arr = columns
+        
+        self._total_segment_count = len(from_arr)
+        if not len(from_arr):
+            return
+        
+        if njit is not None and len(self._cells) <= _KERNEL_MAX_CELLS:
+            self._kernel_segments(from_arr, to_arr, sub_arr, start_arr, end_arr)
+        elif pd is not None:
+            self._grouped_segments(from_arr, to_arr, sub_arr, start_arr, end_arr)
+        else:
+            # Too many cells for the dense kernel and no pandas
+            self._reset()
+            self._python_aggregate(journeys)
+            return
+        self._array_cell_flows(from_arr, to_arr, sub_arr)
+    
+    def _flatten_segments(self, journeys: List[Journey]) -> Tuple[np.ndarray, ...]:
+        """Flatten every segment into (from, to, subscriber, start, end) columns, one segment at a time."""
+        from_ids: List[int] = []
+        to_ids: List[int] = []
+        start_times: List[int] = []
+        end_times: List[int] = []
+        sub_ids: List[int] = []
+        
+        # Single walk over the journeys to flatten every segment into columns
+        for journey in journeys:
+            before = len(to_ids)
+            for from_cell, to_cell in journey.iter_segments():
+                # Intern to_cell first so cell codes follow first-touch order
+                to_ids.append(self._intern(to_cell))
+                from_ids.append(self._intern(from_cell))
+            n = len(to_ids) - before
+            if not n:
+                continue
+            start_times.extend([journey.start_time] * n)
+            end_times.extend([journey.end_time] * n)
+            sub_ids.extend([self._intern_subscriber(journey.subscriber_key)] * n)
+        
+        return (np.asarray(from_ids, dtype=np.int64), np.asarray(to_ids, dtype=np.int64),
+                np.asarray(sub_ids, dtype=np.int64), np.asarray(start_times, dtype=np.int64),
+                np.asarray(end_times, dtype=np.int64))
+    
+    def _flatten_cell_codes(self, journeys: List[Journey]) -> Tuple[np.ndarray, ...]:
+        """
+        Flatten every segment into (from, to, subscriber, start, end) columns.
+        
+        Works on the journeys' cell code arrays, so only one Python step per journey
+        is needed. All journeys must share one cell ID table (come from one tracker).
+        """
+        empty = np.empty(0, dtype=np.int64)
+        codes = [journey.cell_codes for journey in journeys]
+        segment_counts = np.fromiter((len(c) - 1 for c in codes), dtype=np.int64, count=len(codes))
+        moving = np.flatnonzero(segment_counts > 0).tolist()
+        if not moving:
+            return empty, empty, empty, empty, empty
+        segment_counts = segment_counts[moving]
+        
+        # Consecutive codes form a segment unless they straddle two journeys
+        flat = np.concatenate([codes[i] for i in moving]).astype(np.int64)
+        within = np.ones(len(flat) - 1, dtype=bool)
+        within[np.cumsum(segment_counts + 1)[:-1] - 1] = False
+        from_local = flat[:-1][within]
+        to_local = flat[1:][within]
+        
+        # Assign aggregator cell codes in first-touch order (to_cell before from_cell)
+        touches = np.empty(2 * len(from_local), dtype=np.int64)
+        touches[0::2] = to_local
+        touches[1::2] = from_local
+        local_codes, first_touch = np.unique(touches, return_index=True)
+        table = journeys[0].cell_id_table
+        remap = np.empty(len(table), dtype=np.int64)
+        for code in local_codes[np.argsort(first_touch)].tolist():
+            remap[code] = self._intern(table[code])
+        
+        sub_ids = [self._intern_subscriber(journeys[i].subscriber_key) for i in moving]
+        return (
+            remap[from_local],
+            remap[to_local],
+            np.repeat(np.asarray(sub_ids, dtype=np.int64), segment_counts),
+            np.repeat(np.asarray([journeys[i].start_time for i in moving], dtype=np.int64), segment_counts),
+            np.repeat(np.asarray([journeys[i].end_time for i in moving], dtype=np.int64), segment_counts)
+        )
+    
+    def _kernel_segments(self, from_arr, to_arr, sub_arr, start_arr, end_arr):
+        """Fill segment_flows using the numba-compiled dense kernel."""
+        n_cells = len(self._cells)
+        counts, first_seen, last_seen, first_row = _aggregate_kernel(
+            from_arr, to_arr, start_arr, end_arr, n_cells
+        )
+        
+        # Present segments, in first-seen order
+        seg_from, seg_to = np.nonzero(counts)
+        order = np.argsort(first_row[seg_from, seg_to], kind="stable")
+        seg_from = seg_from[order]
+        seg_to = seg_to[order]
+        n_segments = len(seg_from)
+        
+        # Unique (segment, subscriber) pairs give the per-segment subscriber counts
+        n_subs = len(self._sub_id)
+        seg_index = np.full((n_cells, n_cells), -1, dtype=np.int64)
+        seg_index[seg_from, seg_to] = np.arange(n_segments)
+        pairs = _distinct(seg_index[from_arr, to_arr] * n_subs + sub_arr)
+        subscriber_count = np.bincount(pairs // n_subs, minlength=n_segments)
+        
+        self.segment_flows.extend(
+            (seg_from << 32) | seg_to,
+            counts[seg_from, seg_to],
+            subscriber_count,
+            first_seen[seg_from, seg_to],
+            last_seen[seg_from, seg_to]
+        )
+    
+    def _grouped_segments(self, from_arr, to_arr, sub_arr, start_arr, end_arr):
+        """Fill segment_flows with one pandas groupby over packed segment keys."""
+        df = pd.DataFrame({
+            "key": (from_arr << 32) | to_arr,
+            "start": start_arr,
+            "end": end_arr,
+            "subscriber": sub_arr,
+        })
+        grouped = df.groupby("key", sort=False).agg(
+            journey_count=("key", "size"),
+            first_seen=("start", "min"),
+            last_seen=("end", "max"),
+            subscriber_count=("subscriber", "nunique"),
+        )
+        self.segment_flows.extend(
+            grouped.index.to_numpy(),
+            grouped["journey_count"].to_numpy(),
+            grouped["subscriber_count"].to_numpy(),
+            grouped["first_seen"].to_numpy(),
+            grouped["last_seen"].to_numpy()
+        )
+    
+    def _array_cell_flows(self, from_arr, to_arr, sub_arr):
+        """Build cell_flows from the flattened segment arrays."""
+        n_cells = len(self._cells)
+        n_subs = len(self._sub_id)
+        
+        # Entries are keyed on to_cell, exits on from_cell
+        entries = np.bincount(to_arr, minlength=n_cells)
+        exits = np.bincount(from_arr, minlength=n_cells)
+        touches = _distinct(np.concatenate((
+            to_arr * n_subs + sub_arr,
+            from_arr * n_subs + sub_arr
+        )))
+        touch_cells = touches // n_subs
+        touch_subs = touches % n_subs
+        bounds = np.searchsorted(touch_cells, np.arange(n_cells + 1))
+        
+        for code, cell_id in enumerate(self._cells):
+            self.cell_flows[cell_id] = CellFlow(
+                cell_id=cell_id,
+                total_entries=int(entries[code]),
+                total_exits=int(exits[code]),
+                unique_subscribers=SubscriberSet(touch_subs[bounds[code]:bounds[code + 1]].tolist()),
+                entry_counts={},
+                exit_counts={},
+                _cells=self._cells
+            )
+        self._fill_segment_counts()
+    
+    def _fill_segment_counts(self):
+        """Record every segment's journey count as an entry of to_cell and an exit of from_cell."""
+        cells = self._cells
+        for key, count in zip(self.segment_flows.keys.tolist(), self.segment_flows.journey_count.tolist()):
+            self.cell_flows[cells[key & 0xFFFFFFFF]].entry_counts[key] = count
+            self.cell_flows[cells[key >> 32]].exit_counts[key] = count
+    
+    def _python_aggregate(self, journeys: List[Journey]):
+        """Aggregate journeys one segment at a time (used without numba and pandas)."""
+        segment_flows: Dict[int, SegmentFlow] = {}  # segment key -> flow
         
         # Track subscribers per segment
-        segment_subscribers: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        segment_subscribers: Dict[int, SubscriberSet] = defaultdict(SubscriberSet)
+        
+        # Hoist bound methods out of the per-segment loop
+        intern = self._intern
+        update_cell_flow = self._update_cell_flow
+        segment_count = 0
         
         # Process each journey
         for journey in journeys:
-            segments = journey.get_segments()
-            self.journey_segments.extend(segments)
+            sub_id = self._intern_subscriber(journey.subscriber_key)
+            start_time = journey.start_time
+            end_time = journey.end_time
             
             # Track segments
-            for segment in segments:
-                from_cell, to_cell = segment
+            for from_cell, to_cell in journey.iter_segments():
+                segment_count += 1
+                # Intern to_cell first so cell codes follow first-touch order
+                to_code = intern(to_cell)
+                key = (intern(from_cell) << 32) | to_code
                 
-                # Update segment flow
-                if segment not in self.segment_flows:
-                    self.segment_flows[segment] = SegmentFlow(
+                # Update segment flow with a single lookup
+                flow = segment_flows.get(key)
+                if flow is None:
+                    flow = segment_flows[key] = SegmentFlow(
                         from_cell=from_cell,
                         to_cell=to_cell,
                         journey_count=0,
                         subscriber_count=0,
-                        first_seen=journey.start_time,
-                        last_seen=journey.end_time
+                        first_seen=start_time,
+                        last_seen=end_time
                     )
                 
-                flow = self.segment_flows[segment]
                 flow.journey_count += 1
-                segment_subscribers[segment].add(journey.subscriber_key)
+                segment_subscribers[key].add(sub_id)
                 
                 # Update timestamps
-                if journey.start_time < flow.first_seen:
-                    flow.first_seen = journey.start_time
-                if journey.end_time > flow.last_seen:
-                    flow.last_seen = journey.end_time
+                if start_time < flow.first_seen:
+                    flow.first_seen = start_time
+                if end_time > flow.last_seen:
+                    flow.last_seen = end_time
                 
                 # Update cell flows
-                self._update_cell_flow(to_cell, segment, journey.subscriber_key, is_entry=True)
-                self._update_cell_flow(from_cell, segment, journey.subscriber_key, is_entry=False)
+                update_cell_flow(to_cell, key, sub_id, True)
+                update_cell_flow(from_cell, key, sub_id, False)
+        
+        self._total_segment_count += segment_count
         
         # Update subscriber counts
-        for segment, subscribers in segment_subscribers.items():
-            if segment in self.segment_flows:
-                self.segment_flows[segment].subscriber_count = len(subscribers)
+        for key, subscribers in segment_subscribers.items():
+            segment_flows[key].subscriber_count = len(subscribers)
+        
+        flows = list(segment_flows.values())
+        self.segment_flows.extend(
+            list(segment_flows),
+            [f.journey_count for f in flows],
+            [f.subscriber_count for f in flows],
+            [f.first_seen for f in flows],
+            [f.last_seen for f in flows]
+        )
     
-    def _update_cell_flow(self, cell_id: str, segment: Tuple[str, str],
-                         subscriber_key: str, is_entry: bool):
+    def _update_cell_flow(self, cell_id: str, key: int,
+                         sub_id: int, is_entry: bool):
         """Update cell flow statistics."""
-        if cell_id not in self.cell_flows:
-            self.cell_flows[cell_id] = CellFlow(
+        flow = self.cell_flows.get(cell_id)
+        if flow is None:
+            flow = self.cell_flows[cell_id] = CellFlow(
                 cell_id=cell_id,
                 total_entries=0,
                 total_exits=0,
-                unique_subscribers=set(),
-                entry_segments=[],
-                exit_segments=[]
+                unique_subscribers=SubscriberSet(),
+                entry_counts={},
+                exit_counts={},
+                _cells=self._cells
             )
         
-        flow = self.cell_flows[cell_id]
-        flow.unique_subscribers.add(subscriber_key)
+        flow.unique_subscribers.add(sub_id)
         
         if is_entry:
             flow.total_entries += 1
-            flow.entry_segments.append(segment)
+            flow.entry_counts[key] = flow.entry_counts.get(key, 0) + 1
         else:
             flow.total_exits += 1
-            flow.exit_segments.append(segment)
+            flow.exit_counts[key] = flow.exit_counts.get(key, 0) + 1
     
     def get_top_segments(self, limit: int = 10) -> List[SegmentFlow]:
         """Get the top N most traveled segments by journey count."""
-        sorted_segments = sorted(
-            self.segment_flows.values(),
-            key=lambda x: x.journey_count,
-            reverse=True
-        )
-        return sorted_segments[:limit]
+        counts = self.segment_flows.journey_count
+        if limit <= 0 or len(counts) == 0:
+            return []
+        if limit < len(counts):
+            # O(N) selection of the top rows, then sort only those. Rows tied with the
+            # limit-th largest count are taken in row order, as a stable full sort would.
+            threshold = np.partition(counts, -limit)[-limit]
+            above = np.flatnonzero(counts > threshold)
+            tied = np.flatnonzero(counts == threshold)[:limit - len(above)]
+            rows = np.concatenate((above, tied))
+        else:
+            rows = np.arange(len(counts))
+        # Highest count first; ties keep first-seen order
+        rows = rows[np.lexsort((rows, -counts[rows]))]
+        return [self.segment_flows[row] for row in rows]
     
     def get_segment_flow(self, from_cell: str, to_cell: str) -> Optional[SegmentFlow]:
         """Get flow information for a specific segment."""
-        segment = (from_cell, to_cell)
-        return self.segment_flows.get(segment)
+        from_code = self._cell_id_pool.get(from_cell)
+        to_code = self._cell_id_pool.get(to_cell)
+        if from_code is None or to_code is None:
+            return None
+        return self.segment_flows.get((from_code << 32) | to_code)
     
     def get_cell_flow(self, cell_id: str) -> Optional[CellFlow]:
         """Get flow information for a specific cell."""
@@ -149,7 +689,7 @@ class JourneyAggregator:
         """Get aggregation statistics."""
         total_segments = len(self.segment_flows)
         total_cells = len(self.cell_flows)
-        total_journey_segments = len(self.journey_segments)
+        total_journey_segments = self._total_segment_count
         
         if total_segments == 0:
             return {
@@ -160,8 +700,9 @@ class JourneyAggregator:
                 "most_traveled_segment": None
             }
         
-        avg_journeys = sum(f.journey_count for f in self.segment_flows.values()) / total_segments
-        top_segment = self.get_top_segments(limit=1)
+        counts = self.segment_flows.journey_count
+        avg_journeys = float(counts.sum()) / total_segments
+        top_segment = [self.segment_flows[int(np.argmax(counts))]]
         
         return {
             "total_unique_segments": total_segments,
@@ -8,19 +8,70 @@ Each cell site has an ECGI (E-UTRAN Cell Global Identifier) and geographic coord
 
 import sqlite3
 import json
-from typing import Optional, Tuple, List, Dict
+import binascii
+import math
+from typing import Optional, Tuple, List, Dict, Iterable
 from datetime import datetime
+import numpy as np
+
+
+_UPSERT_CELL_SITE_SQL = """
+    INSERT OR REPLACE INTO cell_sites 
+    (ecgi, plmn_identity, cell_id, latitude, longitude, enb_id, cell_name, coverage_radius_meters, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+EARTH_RADIUS_KM = 6371.0
+
+# Parameters per IN (...) query, below SQLite's default host parameter limit
+_BULK_QUERY_PARAMS = 900
+
+# Two-character hex string for every byte value, for vectorized ECGI decoding
+_HEX_TABLE = np.array([f"{i:02x}" for i in range(256)])
+
+
+def haversine_km(lat1: float, lon1: float, lats, lons) -> np.ndarray:
+    """Great-circle distances in kilometres from one point to arrays of points (degrees)."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    dlat = np.radians(lats - lat1)
+    dlon = np.radians(lons - lon1)
+    a = np.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * np.cos(np.radians(lats)) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
 
 
 class CellSiteDB:
     """Database for storing and querying cell site locations."""
     
-    def __init__(self, db_path: str = "cell_sites.db"):
-        """Initialize the database connection and create tables if needed."""
+    def __init__(self, db_path: str = "cell_sites.db", cache: bool = True):
+        """
+        Initialize the database connection and create tables if needed.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            cache: Load all cell sites into an in-memory dict so lookups
+                   by ECGI do not hit SQLite
+        """
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
         self.conn.row_factory = sqlite3.Row
+        # WAL with synchronous=NORMAL avoids an fsync on every commit; the larger page
+        # cache and memory-mapped reads keep lookups off the read() syscall path
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA cache_size=-65536;
+            PRAGMA mmap_size=268435456;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA busy_timeout=5000;
+        """)
+        # Fire DELETE triggers for rows removed by INSERT OR REPLACE, keeping the R*Tree in sync
+        self.conn.execute("PRAGMA recursive_triggers=ON")
+        self._has_rtree = False
         self._create_tables()
+        self._cache: Optional[Dict[str, Dict]] = None  # ecgi -> cell site row
+        if cache:
+            self._cache = {row['ecgi']: dict(row) for row in self.conn.execute("SELECT * FROM cell_sites")}
     
     def _create_tables(self):
         """Create the cell_sites table if it doesn't exist."""
@@ -50,6 +101,54 @@ class CellSiteDB:
         """)
         
         self.conn.commit()
+        self._create_rtree()
+    
+    def _create_rtree(self):
+        """Create the R*Tree spatial index over cell site locations, if SQLite supports it."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS cell_sites_rtree
+                USING rtree(id, minLat, maxLat, minLon, maxLon)
+            """)
+        except sqlite3.OperationalError:
+            # SQLite built without the rtree module: fall back to the B-tree index
+            return
+        
+        # Points are stored as degenerate boxes keyed by the cell_sites rowid
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cell_sites_rtree_insert AFTER INSERT ON cell_sites
+            BEGIN
+                INSERT OR REPLACE INTO cell_sites_rtree
+                VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cell_sites_rtree_update
+            AFTER UPDATE OF latitude, longitude ON cell_sites
+            BEGIN
+                UPDATE cell_sites_rtree
+                SET minLat = new.latitude, maxLat = new.latitude,
+                    minLon = new.longitude, maxLon = new.longitude
+                WHERE id = new.rowid;
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS cell_sites_rtree_delete AFTER DELETE ON cell_sites
+            BEGIN
+                DELETE FROM cell_sites_rtree WHERE id = old.rowid;
+            END
+        """)
+        
+        # Index rows written before the R*Tree existed
+        cursor.execute("""
+            INSERT OR IGNORE INTO cell_sites_rtree
+            SELECT rowid, latitude, latitude, longitude, longitude FROM cell_sites
+            WHERE rowid NOT IN (SELECT id FROM cell_sites_rtree)
+        """)
+        
+        self.conn.commit()
+        self._has_rtree = True
     
     def add_cell_site(self, ecgi: str, plmn_identity: str, cell_id: str,
                      latitude: float, longitude: float,
@@ -57,30 +156,109 @@ class CellSiteDB:
                      cell_name: Optional[str] = None,
                      coverage_radius_meters: Optional[int] = None):
         """Add or update a cell site."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT OR REPLACE INTO cell_sites 
-            (ecgi, plmn_identity, cell_id, latitude, longitude, enb_id, cell_name, coverage_radius_meters, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (ecgi, plmn_identity, cell_id, latitude, longitude, enb_id, cell_name, coverage_radius_meters, datetime.now()))
-        self.conn.commit()
+        with self.conn:
+            self.conn.execute(_UPSERT_CELL_SITE_SQL,
+                              (ecgi, plmn_identity, cell_id, latitude, longitude, enb_id, cell_name, coverage_radius_meters, datetime.now()))
+        if self._cache is not None:
+            self._cache.pop(ecgi, None)
     
-    def get_cell_site(self, ecgi: str) -> Optional[Dict]:
-        """Get cell site information by ECGI."""
+    def add_cell_sites(self, sites: Iterable[Dict]) -> int:
+        """
+        Add or update many cell sites in a single transaction.
+        
+        Args:
+            sites: Dicts with the same keys as add_cell_site's arguments
+        
+        Returns:
+            Number of cell sites written
+        """
+        updated_at = datetime.now()
+        rows = [
+            (site["ecgi"], site["plmn_identity"], site["cell_id"],
+             site["latitude"], site["longitude"], site.get("enb_id"),
+             site.get("cell_name"), site.get("coverage_radius_meters"), updated_at)
+            for site in sites
+        ]
+        with self.conn:
+            self.conn.executemany(_UPSERT_CELL_SITE_SQL, rows)
+        if self._cache is not None:
+            for row in rows:
+                self._cache.pop(row[0], None)
+        return len(rows)
+    
+    def _lookup(self, ecgi: str) -> Optional[Dict]:
+        """Return the cached row for an ECGI, querying SQLite on a cache miss."""
+        if self._cache is not None:
+            cell = self._cache.get(ecgi)
+            if cell is not None:
+                return cell
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM cell_sites WHERE ecgi = ?", (ecgi,))
         row = cursor.fetchone()
-        if row:
-            return dict(row)
+        if not row:
+            return None
+        cell = dict(row)
+        if self._cache is not None:
+            self._cache[ecgi] = cell
+        return cell
+    
+    def get_cell_site(self, ecgi: str) -> Optional[Dict]:
+        """Get cell site information by ECGI."""
+        cell = self._lookup(ecgi)
+        if cell:
+            return dict(cell)
         return None
     
     def get_cell_location(self, ecgi: str) -> Optional[Tuple[float, float]]:
         """Get latitude and longitude for a cell site."""
-        cell = self.get_cell_site(ecgi)
+        cell = self._lookup(ecgi)
         if cell:
             return (cell['latitude'], cell['longitude'])
         return None
     
+    def get_locations_bulk(self, ecgis: Iterable[str]) -> Dict[str, Tuple[float, float]]:
+        """
+        Get latitude and longitude for many cell sites with one query per batch of misses.
+        
+        Returns:
+            Dict of ECGI -> (latitude, longitude); unknown ECGIs are omitted
+        """
+        locations: Dict[str, Tuple[float, float]] = {}
+        missing = []
+        for ecgi in dict.fromkeys(ecgis):
+            cell = self._cache.get(ecgi) if self._cache is not None else None
+            if cell is not None:
+                locations[ecgi] = (cell['latitude'], cell['longitude'])
+            else:
+                missing.append(ecgi)
+        
+        for start in range(0, len(missing), _BULK_QUERY_PARAMS):
+            batch = missing[start:start + _BULK_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            cursor = self.conn.execute(f"SELECT * FROM cell_sites WHERE ecgi IN ({placeholders})", batch)
+            for row in cursor:
+                cell = dict(row)
+                if self._cache is not None:
+                    self._cache[cell['ecgi']] = cell
+                locations[cell['ecgi']] = (cell['latitude'], cell['longitude'])
+        return locations
+    
+    def get_cell_locations(self, ecgis: List[str]) -> np.ndarray:
+        """
+        Get latitude and longitude for many cell sites at once.
+        
+        Returns:
+            (N, 2) float64 array of (latitude, longitude); rows for unknown
+            ECGIs are NaN
+        """
+        known = self.get_locations_bulk(ecgis)
+        locations = np.full((len(ecgis), 2), np.nan, dtype=np.float64)
+        for i, ecgi in enumerate(ecgis):
+            location = known.get(ecgi)
+            if location is not None:
+                locations[i] = location
+        return locations
+    
     def get_all_cell_sites(self) -> List[Dict]:
         """Get all cell sites."""
         cursor = self.conn.cursor()
@@ -90,37 +268,71 @@ class CellSiteDB:
     def search_cell_sites_by_location(self, latitude: float, longitude: float,
                                      radius_km: float = 10.0) -> List[Dict]:
         """Find cell sites within a radius of a location."""
-        # Simple bounding box search (for production, use proper geospatial queries)
+        # Bounding box prefilter, then exact great-circle distance
         cursor = self.conn.cursor()
-        # Approximate: 1 degree latitude ≈ 111 km
-        lat_delta = radius_km / 111.0
-        # Longitude delta depends on latitude
-        lon_delta = radius_km / (111.0 * abs(latitude / 90.0) if latitude != 0 else 111.0)
+        angular_radius = radius_km / EARTH_RADIUS_KM
+        lat_delta = math.degrees(angular_radius)
+        # Longitude delta widens with latitude; near the poles the box spans all longitudes
+        cos_lat = math.cos(math.radians(latitude))
+        min_lon, max_lon = -180.0, 180.0
+        if angular_radius < math.pi / 2 and math.sin(angular_radius) < cos_lat:
+            lon_delta = math.degrees(math.asin(math.sin(angular_radius) / cos_lat))
+            if -180.0 <= longitude - lon_delta and longitude + lon_delta <= 180.0:
+                min_lon, max_lon = longitude - lon_delta, longitude + lon_delta
+        box = (latitude - lat_delta, latitude + lat_delta, min_lon, max_lon)
         
-        cursor.execute("""
-            SELECT * FROM cell_sites
-            WHERE latitude BETWEEN ? AND ?
-            AND longitude BETWEEN ? AND ?
-        """, (latitude - lat_delta, latitude + lat_delta,
-              longitude - lon_delta, longitude + lon_delta))
+        if self._has_rtree:
+            cursor.execute("""
+                SELECT c.* FROM cell_sites_rtree r
+                JOIN cell_sites c ON c.rowid = r.id
+                WHERE r.maxLat >= ? AND r.minLat <= ?
+                AND r.maxLon >= ? AND r.minLon <= ?
+            """, box)
+        else:
+            cursor.execute("""
+                SELECT * FROM cell_sites
+                WHERE latitude BETWEEN ? AND ?
+                AND longitude BETWEEN ? AND ?
+            """, box)
         
-        results = [dict(row) for row in cursor.fetchall()]
-        # Filter by actual distance (Haversine formula would be better for production)
-        return results
+        rows = cursor.fetchall()
+        if not rows:
+            return []
+        lats = np.fromiter((row['latitude'] for row in rows), dtype=np.float64, count=len(rows))
+        lons = np.fromiter((row['longitude'] for row in rows), dtype=np.float64, count=len(rows))
+        within = haversine_km(latitude, longitude, lats, lons) <= radius_km
+        return [dict(rows[i]) for i in np.flatnonzero(within)]
     
     def ecgi_to_string(self, ecgi_bytes: bytes) -> str:
         """Convert ECGI bytes to a string representation."""
         if not ecgi_bytes:
             return ""
         # ECGI is typically: PLMN (3 bytes) + Cell ID (28 bits = 3.5 bytes, stored as 4 bytes)
-        if len(ecgi_bytes) >= 3:
-            plmn = ecgi_bytes[:3].hex()
-            cell_id = ecgi_bytes[3:].hex() if len(ecgi_bytes) > 3 else ""
-            return f"{plmn}:{cell_id}"
-        return ecgi_bytes.hex()
+        h = binascii.hexlify(ecgi_bytes).decode('ascii')
+        return f"{h[:6]}:{h[6:]}" if len(ecgi_bytes) >= 3 else h
+    
+    def ecgis_to_strings(self, ecgi_array: np.ndarray) -> np.ndarray:
+        """
+        Convert a batch of fixed-length ECGIs to string representations.
+        
+        Args:
+            ecgi_array: (N, k) uint8 array with one ECGI per row, k >= 3
+        
+        Returns:
+            (N,) unicode array matching ecgi_to_string for each row
+        """
+        arr = np.ascontiguousarray(ecgi_array, dtype=np.uint8)
+        n, width = arr.shape
+        plmn = _HEX_TABLE[arr[:, :3]].view("<U6").reshape(n)
+        if width == 3:
+            return np.char.add(plmn, ":")
+        cell_id = _HEX_TABLE[arr[:, 3:]].view(f"<U{2 * (width - 3)}").reshape(n)
+        return np.char.add(np.char.add(plmn, ":"), cell_id)
     
     def close(self):
-        """Close the database connection."""
+        """Checkpoint the write-ahead log and close the database connection."""
+        # Fold the WAL back into the main file so it is not left behind on disk
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         self.conn.close()
     
     def __enter__(self):
@@ -186,10 +398,9 @@ def init_sample_cell_sites(db: CellSiteDB):
         },
     ]
     
-    for site in sample_sites:
-        db.add_cell_site(**site)
+    count = db.add_cell_sites(sample_sites)
     
-    print(f"Initialized {len(sample_sites)} sample cell sites")
+    print(f"Initialized {count} sample cell sites")
 
 
 if __name__ == "__main__":
@@ -6,16 +6,219 @@ Generates sample S1-SEE events for testing the population movement application.
 Creates realistic mobility patterns with multiple subscribers moving between cell sites.
 """
 
+import os
 import json
+import heapq
 import random
+import shutil
 import argparse
+import multiprocessing
 from datetime import datetime, timedelta
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the standard library encoder
+    orjson = None
+
+# Number of encoded events buffered before each write
+_WRITE_BATCH_EVENTS = 65536
+
+# Journeys per block in the incremental path. Each block has its own random stream
+# and is the unit handed to workers, so the output does not depend on the worker count
+_JOURNEY_BLOCK = 16384
+
+# Route steps (max 5) plus up to 2 additional movements
+_MAX_STEPS = 7
+
+# Spacing between per-block seeds derived from the base seed
+_BLOCK_SEED_STRIDE = 1_000_003
+
+
+def _encode_event(event: dict) -> bytes:
+    """Serialize an event to compact JSON bytes (no trailing newline)."""
+    if orjson is not None:
+        return orjson.dumps(event)
+    return json.dumps(event, separators=(',', ':')).encode('utf-8')
+
+
+def _write_batch(f, buf: list):
+    """Write a batch of encoded events as JSONL lines and empty the buffer."""
+    if buf:
+        f.write(b'\n'.join(buf) + b'\n')
+        buf.clear()
+
+
+def _sample_distinct(rng: np.random.Generator, n: int, n_items: int, k: int) -> np.ndarray:
+    """Draw k distinct indices from range(n_items) for each of n rows."""
+    if n_items <= 64:
+        return rng.random((n, n_items)).argsort(axis=1)[:, :k]
+    # Few collisions for larger populations: redraw only the rows with duplicates
+    picks = rng.integers(0, n_items, size=(n, k))
+    while True:
+        ordered = np.sort(picks, axis=1)
+        dup = np.flatnonzero((ordered[:, 1:] == ordered[:, :-1]).any(axis=1))
+        if len(dup) == 0:
+            return picks
+        picks[dup] = rng.integers(0, n_items, size=(len(dup), k))
+
+
+def _plan_journeys(rng: np.random.Generator, n: int, n_cells: int) -> dict:
+    """
+    Draw the random choices for n journeys at once.
+    
+    Returns arrays with one row per journey:
+        cells: (n, _MAX_STEPS) cell indices visited
+        steps: number of events in the journey
+        offsets: (n, _MAX_STEPS) ns offsets of each event from the journey start
+        switch: whether the next journey moves on to a new subscriber
+        switch_gap: ns added after the journey when switching subscriber
+    """
+    rows = np.arange(n)
+    cells = np.zeros((n, _MAX_STEPS), dtype=np.int64)
+    route_len = np.empty(n, dtype=np.int64)
+    
+    route_type = rng.random(n)
+    # 30% follow a common route: 1 -> 2 -> 3 -> 4
+    common_a = route_type < 0.3
+    cells[common_a, :4] = [0, 1, 2, 3]
+    route_len[common_a] = 4
+    # 30% follow another common route: 1 -> 3 -> 5
+    common_b = (route_type >= 0.3) & (route_type < 0.6)
+    cells[common_b, :3] = [0, 2, 4]
+    route_len[common_b] = 3
+    # 40% have random routes
+    random_rows = np.flatnonzero(route_type >= 0.6)
+    k = np.minimum(n_cells, rng.integers(2, 6, size=len(random_rows)))
+    cells[random_rows, :min(n_cells, 5)] = _sample_distinct(rng, len(random_rows), n_cells, min(n_cells, 5))
+    route_len[random_rows] = k
+    
+    # Add some random additional movements (0-2 extra events), 70% chance of moving
+    num_additional = rng.integers(0, 3, size=n)
+    moves = rng.random((n, 2)) < 0.7
+    move_cells = rng.integers(0, n_cells, size=(n, 2))
+    for m in range(2):
+        previous = cells[rows, route_len + m - 1]
+        cells[rows, route_len + m] = np.where(moves[:, m], move_cells[:, m], previous)
+    
+    # Time between handovers (1-10 minutes); the first event has no gap
+    gap_seconds = rng.integers(60, 601, size=(n, _MAX_STEPS))
+    gap_seconds[:, 0] = 0
+    offsets = np.cumsum(gap_seconds, axis=1) * 1_000_000_000
+    
+    # 30% chance to switch subscriber, with a time gap between subscribers
+    switch = rng.random(n) < 0.3
+    switch_gap = np.where(switch, rng.integers(0, 3601, size=n), 0) * 1_000_000_000
+    
+    return {
+        "cells": cells,
+        "steps": route_len + num_additional,
+        "offsets": offsets,
+        "switch": switch,
+        "switch_gap": switch_gap,
+    }
+
+
+def _plan_block(base_seed: int, block: int, n: int, n_cells: int) -> tuple:
+    """
+    Plan the n journeys of one block from the block's own random stream.
+    
+    Returns:
+        (plan, durations) where durations[i] is the ns from journey i's start to the next's
+    """
+    plan = _plan_journeys(np.random.default_rng(base_seed + block * _BLOCK_SEED_STRIDE), n, n_cells)
+    durations = plan["offsets"][np.arange(n), plan["steps"] - 1] + plan["switch_gap"]
+    return plan, durations
+
+
+def _generate_blocks(blocks: list, base_seed: int, cell_sites: list, out_path: str) -> tuple:
+    """
+    Generate consecutive blocks of journeys in chronological order.
+    
+    Each block is (block index, journey count, start time, first subscriber index);
+    blocks occupy disjoint time windows, so writing them in order keeps events sorted.
+    
+    Returns:
+        (events_written, journey_count, first_ts, last_ts)
+    """
+    # Within a block, each journey starts after the previous one ends, so events
+    # are generated in chronological order and need no sorting
+    events_written = 0
+    journey_count = 0
+    first_ts = None
+    last_ts = None
+    buf = []  # Encoded events awaiting write
+    
+    with open(out_path, 'wb') as f:
+        for block, n, event_time, subscriber_idx in blocks:
+            plan, durations = _plan_block(base_seed, block, n, len(cell_sites))
+            
+            # Start time (relative to event_time) and subscriber of every journey in the block
+            start_offsets = np.concatenate(([0], np.cumsum(durations)[:-1]))
+            subscriber_ids = subscriber_idx + np.concatenate(([0], np.cumsum(plan["switch"])[:-1]))
+            
+            for steps, path, offsets, start_offset, sub_idx in zip(
+                    plan["steps"].tolist(), plan["cells"].tolist(), plan["offsets"].tolist(),
+                    start_offsets.tolist(), subscriber_ids.tolist()):
+                subscriber_key = f"IMSI:{123456789000000 + sub_idx}"
+                start = event_time + start_offset
+                current_cell = None
+                
+                for i in range(steps):
+                    next_cell = cell_sites[path[i]]
+                    event = {
+                        "name": "Mobility.Handover.Notified",
+                        "ts": start + offsets[i],
+                        "subscriber_key": subscriber_key,
+                        "attributes": {
+                            "target_cell_id": next_cell,
+                        },
+                        "confidence": 1.0,
+                        "ruleset_id": "mobility",
+                        "ruleset_version": "1.0"
+                    }
+                    
+                    if current_cell:
+                        event["attributes"]["source_cell_id"] = current_cell
+                    
+                    buf.append(_encode_event(event))
+                    current_cell = next_cell
+                
+                events_written += steps
+                if first_ts is None:
+                    first_ts = start
+                last_ts = start + offsets[steps - 1]
+                
+                # Write in batches
+                if len(buf) >= _WRITE_BATCH_EVENTS:
+                    _write_batch(f, buf)
+            
+            journey_count += n
+        
+        # Write remaining events
+        _write_batch(f, buf)
+    
+    return events_written, journey_count, first_ts, last_ts
+
+
+def _concatenate_parts(parts: list, output_file: str):
+    """Concatenate part files into output_file in order, then delete them."""
+    try:
+        with open(output_file, 'wb') as f:
+            for path in parts:
+                with open(path, 'rb') as part:
+                    shutil.copyfileobj(part, f)
+    finally:
+        for path in parts:
+            os.remove(path)
 
 
 def generate_sample_events(output_file: str, num_subscribers: int = 50,
                           num_events_per_subscriber: int = 10,
                           num_journeys: int = None,
-                          cell_sites: list = None):
+                          cell_sites: list = None,
+                          workers: int = 1,
+                          seed: int = None):
     """
     Generate sample S1-SEE mobility events.
     
@@ -25,6 +228,9 @@ def generate_sample_events(output_file: str, num_subscribers: int = 50,
         num_events_per_subscriber: Average number of events per subscriber (ignored if num_journeys is set)
         num_journeys: Target number of journeys to generate (takes precedence)
         cell_sites: List of cell site ECGIs (uses defaults if None)
+        workers: Worker processes generating journey blocks (num_journeys > 1000 only)
+        seed: Base random seed; the same seed reproduces the same events relative to
+              the start time, whatever the number of workers
     """
     if cell_sites is None:
         # Default cell sites (matching sample database)
@@ -53,133 +259,58 @@ def generate_sample_events(output_file: str, num_subscribers: int = 50,
     use_incremental = num_journeys is not None and num_journeys > 1000
     
     if use_incremental:
-        # Write events incrementally
-        events_written = 0
-        journey_count = 0
-        all_events = []  # Small buffer for sorting
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy)
         
-        with open(output_file, 'w') as f:
-            subscriber_idx = 0
-            event_time = base_time
-            
-            while journey_count < num_journeys:
-                subscriber_key = f"IMSI:{123456789000000 + subscriber_idx}"
-                
-                # Determine route pattern
-                route_type = random.random()
-                if route_type < 0.3:
-                    # 30% follow a common route: 1 -> 2 -> 3 -> 4
-                    route = cell_sites[:4]
-                elif route_type < 0.6:
-                    # 30% follow another common route: 1 -> 3 -> 5
-                    route = [cell_sites[0], cell_sites[2], cell_sites[4]]
-                else:
-                    # 40% have random routes
-                    route = random.sample(cell_sites, min(len(cell_sites), random.randint(2, 5)))
-                
-                # Generate events along the route
-                current_cell = None
-                journey_events = []
-                
-                for i, next_cell in enumerate(route):
-                    # Time between handovers (1-10 minutes)
-                    if i > 0:
-                        gap_seconds = random.randint(60, 600)
-                        event_time += gap_seconds * 1_000_000_000
-                    
-                    event = {
-                        "name": "Mobility.Handover.Notified",
-                        "ts": event_time,
-                        "subscriber_key": subscriber_key,
-                        "attributes": {
-                            "target_cell_id": next_cell,
-                        },
-                        "confidence": 1.0,
-                        "ruleset_id": "mobility",
-                        "ruleset_version": "1.0"
-                    }
-                    
-                    if current_cell:
-                        event["attributes"]["source_cell_id"] = current_cell
-                    
-                    journey_events.append(event)
-                    current_cell = next_cell
-                
-                # Add some random additional movements (0-2 extra events)
-                num_additional = random.randint(0, 2)
-                for _ in range(num_additional):
-                    gap_seconds = random.randint(60, 600)
-                    event_time += gap_seconds * 1_000_000_000
-                    
-                    if random.random() < 0.7:  # 70% chance of moving
-                        next_cell = random.choice(cell_sites)
-                    else:
-                        next_cell = current_cell
-                    
-                    event = {
-                        "name": "Mobility.Handover.Notified",
-                        "ts": event_time,
-                        "subscriber_key": subscriber_key,
-                        "attributes": {
-                            "source_cell_id": current_cell,
-                            "target_cell_id": next_cell,
-                        },
-                        "confidence": 1.0,
-                        "ruleset_id": "mobility",
-                        "ruleset_version": "1.0"
-                    }
-                    
-                    journey_events.append(event)
-                    current_cell = next_cell
-                
-                # Add to buffer
-                all_events.extend(journey_events)
-                journey_count += 1
-                
-                # Write in batches to maintain approximate chronological order
-                if len(all_events) >= 1000:
-                    all_events.sort(key=lambda x: x["ts"])
-                    for event in all_events:
-                        f.write(json.dumps(event) + '\n')
-                        events_written += 1
-                    all_events = []
-                
-                # Move to next subscriber periodically
-                if random.random() < 0.3:  # 30% chance to switch subscriber
-                    subscriber_idx += 1
-                    # Add time gap between different subscribers
-                    event_time += random.randint(0, 3600) * 1_000_000_000
-            
-            # Write remaining events
-            if all_events:
-                all_events.sort(key=lambda x: x["ts"])
-                for event in all_events:
-                    f.write(json.dumps(event) + '\n')
-                    events_written += 1
+        # Lay out the blocks back to back: planning a block only draws random numbers,
+        # which is cheap next to building and encoding its events in a worker
+        blocks = []
+        event_time = base_time
+        subscriber_idx = 0
+        for block, first in enumerate(range(0, num_journeys, _JOURNEY_BLOCK)):
+            n = min(_JOURNEY_BLOCK, num_journeys - first)
+            plan, durations = _plan_block(seed, block, n, len(cell_sites))
+            blocks.append((block, n, event_time, subscriber_idx))
+            event_time += int(durations.sum())
+            subscriber_idx += int(plan["switch"].sum())
         
-        # Final sort of the entire file to ensure chronological order
-        print("Sorting events chronologically...")
-        with open(output_file, 'r') as f:
-            events = [json.loads(line) for line in f]
+        # Each worker writes a contiguous run of blocks to its own file, and the
+        # files are joined in order
+        n_shards = max(1, min(workers, len(blocks)))
+        bounds = [len(blocks) * shard_id // n_shards for shard_id in range(n_shards + 1)]
+        shards = [blocks[bounds[shard_id]:bounds[shard_id + 1]] for shard_id in range(n_shards)]
         
-        events.sort(key=lambda x: x["ts"])
+        if n_shards == 1:
+            results = [_generate_blocks(blocks, seed, cell_sites, output_file)]
+        else:
+            parts = [f"{output_file}.part{shard_id}" for shard_id in range(n_shards)]
+            with multiprocessing.Pool(n_shards) as pool:
+                results = pool.starmap(_generate_blocks, [
+                    (shards[shard_id], seed, cell_sites, parts[shard_id]) for shard_id in range(n_shards)
+                ])
+            _concatenate_parts(parts, output_file)
         
-        with open(output_file, 'w') as f:
-            for event in events:
-                f.write(json.dumps(event) + '\n')
+        events_written = sum(r[0] for r in results)
+        journey_count = sum(r[1] for r in results)
         
-        print(f"Generated {len(events)} events for {journey_count} journeys")
+        print(f"Generated {events_written} events for {journey_count} journeys")
         print(f"Events written to: {output_file}")
-        if events:
-            print(f"Time range: {datetime.fromtimestamp(events[0]['ts'] / 1e9)} to {datetime.fromtimestamp(events[-1]['ts'] / 1e9)}")
+        if events_written:
+            first_ts = min(r[2] for r in results if r[2] is not None)
+            last_ts = max(r[3] for r in results if r[3] is not None)
+            print(f"Time range: {datetime.fromtimestamp(first_ts / 1e9)} to {datetime.fromtimestamp(last_ts / 1e9)}")
         
     else:
         # Original approach for smaller datasets
-        events = []
+        if seed is not None:
+            random.seed(seed)
+        # One chronological event list per subscriber
+        subscriber_streams = []
         
         # Generate events for each subscriber
         for subscriber_idx in range(num_subscribers):
             subscriber_key = f"IMSI:{123456789000000 + subscriber_idx}"
+            events = []
             
             # Each subscriber follows a route (some shared, some unique)
             if subscriber_idx < num_subscribers * 0.3:
@@ -248,19 +379,29 @@ def generate_sample_events(output_file: str, num_subscribers: int = 50,
                 
                 events.append(event)
                 current_cell = next_cell
+            
+            if events:
+                subscriber_streams.append(events)
         
-        # Sort events by timestamp
-        events.sort(key=lambda x: x["ts"])
-        
-        # Write to JSONL file
-        with open(output_file, 'w') as f:
-            for event in events:
-                f.write(json.dumps(event) + '\n')
+        # Each subscriber's events are already in time order, so a k-way merge yields
+        # the globally sorted stream (ties keep subscriber order, as a stable sort would)
+        events_written = 0
+        buf = []
+        with open(output_file, 'wb') as f:
+            for event in heapq.merge(*subscriber_streams, key=lambda x: x["ts"]):
+                buf.append(_encode_event(event))
+                if len(buf) >= _WRITE_BATCH_EVENTS:
+                    events_written += len(buf)
+                    _write_batch(f, buf)
+            events_written += len(buf)
+            _write_batch(f, buf)
         
-        print(f"Generated {len(events)} events for {num_subscribers} subscribers")
+        print(f"Generated {events_written} events for {num_subscribers} subscribers")
         print(f"Events written to: {output_file}")
-        if events:
-            print(f"Time range: {datetime.fromtimestamp(events[0]['ts'] / 1e9)} to {datetime.fromtimestamp(events[-1]['ts'] / 1e9)}")
+        if subscriber_streams:
+            first_ts = min(stream[0]["ts"] for stream in subscriber_streams)
+            last_ts = max(stream[-1]["ts"] for stream in subscriber_streams)
+            print(f"Time range: {datetime.fromtimestamp(first_ts / 1e9)} to {datetime.fromtimestamp(last_ts / 1e9)}")
 
 
 def main():
@@ -294,6 +435,17 @@ def main():
         type=int,
         help="Target number of journeys to generate (takes precedence over --subscribers)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for generating journeys (default: 1)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Random seed for reproducible output"
+    )
     
     args = parser.parse_args()
     
@@ -302,7 +454,9 @@ def main():
         num_subscribers=args.subscribers,
         num_events_per_subscriber=args.events_per_subscriber,
         num_journeys=args.journeys,
-        cell_sites=args.cell_sites
+        cell_sites=args.cell_sites,
+        workers=args.workers,
+        seed=args.seed
     )
 
 
@@ -7,64 +7,376 @@ Each journey represents a sequence of cell site visits for a subscriber.
 """
 
 import json
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+import mmap
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import timedelta
+from dataclasses import dataclass, asdict, field
 from collections import defaultdict
+from itertools import chain, islice
+from operator import itemgetter
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the standard library parser
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # Optional: without numba, process_events tracks events one at a time
+    njit = None
+
+
+# Events per process_events_batch call made by process_events; bounds memory on long streams
+_BATCH_EVENTS = 1 << 16
+
+_get_core_fields = itemgetter("name", "ts", "subscriber_key", "attributes")
+
+
+def _event_fields(event: Dict) -> Tuple[str, int, str, Dict]:
+    """(name, ts, subscriber_key, attributes) of an event, defaulting missing keys."""
+    try:
+        return _get_core_fields(event)
+    except KeyError:
+        return (event.get("name", ""), event.get("ts", 0),
+                event.get("subscriber_key", ""), event.get("attributes", {}))
+
+
+def _extract_any_cell_id(attributes: Dict) -> Optional[str]:
+    """Cell ID of an event whose schema is not known: target cell, else cell."""
+    return attributes.get("target_cell_id") or attributes.get("cell_id")
+
+
+# Cell ID extractor per event name, for events whose attribute schema is fixed
+# (see config/rulesets/mobility.yaml); other events use _extract_any_cell_id
+_CELL_ID_EXTRACTORS = {
+    "Mobility.Handover.Notified": lambda attributes: attributes.get("target_cell_id"),
+}
 
 
 @dataclass
 class CellVisit:
     """Represents a visit to a cell site."""
+    __slots__ = ("cell_id", "timestamp", "event_name", "subscriber_key")
     cell_id: str
     timestamp: int  # Unix timestamp in nanoseconds
     event_name: str
     subscriber_key: str
 
 
+class _StringPool:
+    """Interns strings to dense integer codes and back."""
+    
+    __slots__ = ("codes", "values")
+    
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+    
+    def intern(self, value: str) -> int:
+        """Return the code for value, assigning the next one on first sight."""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class _VisitStore:
+    """
+    Structure-of-arrays storage for the visits of completed journeys.
+    
+    Each journey's visits occupy one contiguous row range; cells and event names
+    are stored as codes into the store's string pools.
+    """
+    
+    _INITIAL_CAPACITY = 1024
+    
+    def __init__(self, capacity: int = _INITIAL_CAPACITY):
+        self.cells = _StringPool()
+        self.event_names = _StringPool()
+        self._size = 0
+        self.cell_codes = np.empty(capacity, dtype=np.int32)
+        self.timestamps = np.empty(capacity, dtype=np.int64)
+        self.event_name_codes = np.empty(capacity, dtype=np.int32)
+        self._pools_only: Optional["_VisitStore"] = None
+    
+    def pools_only(self) -> "_VisitStore":
+        """An empty store sharing this store's string pools (created once, then reused)."""
+        if self._pools_only is None:
+            stub = _VisitStore(capacity=0)
+            stub.cells = self.cells
+            stub.event_names = self.event_names
+            self._pools_only = stub
+        return self._pools_only
+    
+    def _reserve(self, needed: int):
+        """Grow all columns (doubling) so at least `needed` rows fit."""
+        capacity = len(self.timestamps)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity = capacity * 2 or self._INITIAL_CAPACITY
+        self.cell_codes = np.resize(self.cell_codes, capacity)
+        self.timestamps = np.resize(self.timestamps, capacity)
+        self.event_name_codes = np.resize(self.event_name_codes, capacity)
+    
+    def extend(self, cell_codes, timestamps, event_name_codes) -> int:
+        """Append visit rows in bulk and return the index of the first one."""
+        start = self._size
+        stop = start + len(cell_codes)
+        self._reserve(stop)
+        self.cell_codes[start:stop] = cell_codes
+        self.timestamps[start:stop] = timestamps
+        self.event_name_codes[start:stop] = event_name_codes
+        self._size = stop
+        return start
+    
+    def __len__(self) -> int:
+        return self._size
+
+
 @dataclass
 class Journey:
-    """Represents a complete journey for a subscriber."""
+    """
+    Represents a complete journey for a subscriber.
+    
+    A completed journey's visits are the rows [_start, _end) of the tracker's visit
+    store; while the journey is active they are buffered in _open as
+    (cell codes, timestamps, event name codes) lists. A pickled journey carries its
+    visits in _open and only the store's string pools, not the whole store.
+    
+    Journeys are created by JourneyTracker; use Journey.from_visits to build one
+    from a list of CellVisit objects.
+    """
     subscriber_key: str
-    visits: List[CellVisit]
     start_time: int
     end_time: int
-    journey_id: str  # Unique identifier for this journey
+    journey_id: int  # Unique identifier for this journey (per tracker)
+    _store: Optional[_VisitStore] = field(default=None, repr=False, compare=False)
+    _start: int = field(default=0, repr=False, compare=False)
+    _end: int = field(default=0, repr=False, compare=False)
+    _open: Optional[Tuple[List[int], List[int], List[int]]] = field(default=None, repr=False, compare=False)
+    
+    def __post_init__(self):
+        if self._store is None:
+            raise ValueError("Journey has no visit store; create it with JourneyTracker "
+                             "or Journey.from_visits")
+    
+    @classmethod
+    def from_visits(cls, visits: List[CellVisit], journey_id: int = 0) -> "Journey":
+        """Build a journey from its visits, in visit order (at least one)."""
+        if not visits:
+            raise ValueError("A journey needs at least one visit")
+        store = _VisitStore(capacity=0)
+        cell_codes = [store.cells.intern(visit.cell_id) for visit in visits]
+        timestamps = [visit.timestamp for visit in visits]
+        event_name_codes = [store.event_names.intern(visit.event_name) for visit in visits]
+        return cls(
+            subscriber_key=visits[0].subscriber_key,
+            start_time=timestamps[0],
+            end_time=timestamps[-1],
+            journey_id=journey_id,
+            _store=store,
+            _open=(cell_codes, timestamps, event_name_codes)
+        )
+    
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        if self._store is not None:
+            if self._open is None:
+                rows = slice(self._start, self._end)
+                state["_open"] = (self._store.cell_codes[rows].tolist(),
+                                  self._store.timestamps[rows].tolist(),
+                                  self._store.event_name_codes[rows].tolist())
+                state["_start"] = state["_end"] = 0
+            # Journeys pickled together share one stub, so they still share a cell table
+            state["_store"] = self._store.pools_only()
+        return state
+    
+    @property
+    def num_visits(self) -> int:
+        """Number of cell visits in the journey."""
+        if self._open is not None:
+            return len(self._open[0])
+        return self._end - self._start
+    
+    @property
+    def cell_codes(self) -> np.ndarray:
+        """Interned codes of the visited cells, in visit order."""
+        if self._open is not None:
+            return np.asarray(self._open[0], dtype=np.int32)
+        return self._store.cell_codes[self._start:self._end]
+    
+    @property
+    def visits(self) -> List[CellVisit]:
+        """The journey's visits, built from the visit store on each access."""
+        if self._open is not None:
+            cell_codes, timestamps, event_name_codes = self._open
+        else:
+            rows = slice(self._start, self._end)
+            cell_codes = self._store.cell_codes[rows].tolist()
+            timestamps = self._store.timestamps[rows].tolist()
+            event_name_codes = self._store.event_name_codes[rows].tolist()
+        cell_ids = self._store.cells.values
+        event_names = self._store.event_names.values
+        return [
+            CellVisit(cell_ids[cell], ts, event_names[name], self.subscriber_key)
+            for cell, ts, name in zip(cell_codes, timestamps, event_name_codes)
+        ]
     
     def get_path(self) -> List[str]:
         """Get the ordered list of cell IDs visited."""
-        return [visit.cell_id for visit in self.visits]
+        if self._open is not None:
+            cell_codes = self._open[0]
+        else:
+            cell_codes = self._store.cell_codes[self._start:self._end].tolist()
+        cell_ids = self._store.cells.values
+        return [cell_ids[cell] for cell in cell_codes]
+    
+    @property
+    def cell_id_table(self) -> List[str]:
+        """Cell IDs indexed by the codes in cell_codes (shared by one tracker's journeys)."""
+        return self._store.cells.values
+    
+    def get_segments_array(self) -> np.ndarray:
+        """Get journey segments as an (N-1, 2) array of (from, to) cell codes."""
+        cells = self.cell_codes
+        return np.stack((cells[:-1], cells[1:]), axis=1)
     
     def get_segments(self) -> List[Tuple[str, str]]:
         """Get journey segments as (from_cell, to_cell) tuples."""
-        segments = []
-        for i in range(len(self.visits) - 1):
-            segments.append((self.visits[i].cell_id, self.visits[i + 1].cell_id))
-        return segments
+        path = self.get_path()
+        return list(zip(path, path[1:]))
+    
+    def iter_segments(self) -> Iterator[Tuple[str, str]]:
+        """Yield journey segments as (from_cell, to_cell) tuples without building a list."""
+        path = self.get_path()
+        yield from zip(path, path[1:])
+
+
+def _track_kernel(order, timestamps, subscriber_ids, target_cells,
+                  last_ts, last_cell, journey_of, n_existing, gap_ns):
+    """
+    Assign a batch of events to journeys.
+    
+    order lists the events grouped by subscriber, in event order within each group,
+    so each subscriber is one contiguous run scanned with its state held in locals.
+    Per-subscriber state (last visit time, last visited cell, current journey index,
+    -1 for none) is read from and written back to the last_ts, last_cell and
+    journey_of arrays once per run. New journeys are numbered from n_existing in
+    start order.
+    
+    Returns:
+        (visit_journey, closed) where visit_journey[i] is the journey event i adds a
+        visit to (-1 if it adds none) and closed[i] is the journey event i closes by
+        a time gap (-1 if none)
+    """
+    n = len(order)
+    visit_journey = np.full(n, -1, dtype=np.int64)
+    closed = np.full(n, -1, dtype=np.int64)
+    k = 0
+    while k < n:
+        sub = subscriber_ids[order[k]]
+        journey = journey_of[sub]
+        prev_ts = last_ts[sub]
+        prev_cell = last_cell[sub]
+        while k < n and subscriber_ids[order[k]] == sub:
+            i = order[k]
+            k += 1
+            cell = target_cells[i]
+            ts = timestamps[i]
+            if journey >= 0 and ts - prev_ts <= gap_ns:
+                # Continue the journey, recording only moves to a different cell
+                if cell != prev_cell:
+                    visit_journey[i] = journey
+                    prev_ts = ts
+                    prev_cell = cell
+                continue
+            if journey >= 0:
+                # Gap too large: close the journey before starting a new one
+                closed[i] = journey
+            # Provisionally number the new journey after the event that starts it
+            journey = n_existing + i
+            visit_journey[i] = journey
+            prev_ts = ts
+            prev_cell = cell
+        journey_of[sub] = journey
+        last_ts[sub] = prev_ts
+        last_cell[sub] = prev_cell
+    
+    # Renumber new journeys densely in start order
+    number = np.empty(n, dtype=np.int64)
+    next_journey = n_existing
+    for i in range(n):
+        if visit_journey[i] == n_existing + i:
+            number[i] = next_journey
+            next_journey += 1
+    for i in range(n):
+        if visit_journey[i] >= n_existing:
+            visit_journey[i] = number[visit_journey[i] - n_existing]
+        if closed[i] >= n_existing:
+            closed[i] = number[closed[i] - n_existing]
+    for sub in range(len(journey_of)):
+        if journey_of[sub] >= n_existing:
+            journey_of[sub] = number[journey_of[sub] - n_existing]
+    return visit_journey, closed
+
+
+if njit is not None:
+    # An explicit signature compiles eagerly at import (or loads from the on-disk
+    # cache), so the first batch does not pay the JIT compile
+    _track_kernel = njit(
+        "Tuple((int64[:], int64[:]))"
+        "(int64[:], int64[:], int64[:], int64[:], int64[:], int64[:], int64[:], int64, int64)",
+        cache=True
+    )(_track_kernel)
 
 
 class JourneyTracker:
     """Tracks journeys from S1-SEE events."""
     
-    def __init__(self, max_journey_gap_seconds: int = 3600):
+    def __init__(self, max_journey_gap_seconds: int = 3600,
+                 on_journey_complete: Optional[Callable[[Journey], None]] = None,
+                 keep_completed_journeys: bool = True):
         """
         Initialize the journey tracker.
         
         Args:
             max_journey_gap_seconds: Maximum time gap between visits to consider
                                     them part of the same journey (default: 1 hour)
+            on_journey_complete: Called with each journey as it completes, e.g.
+                                JourneyAggregator.ingest_journey
+            keep_completed_journeys: Keep completed journeys in completed_journeys;
+                                    turn off to stream them to on_journey_complete only
         """
         self.max_journey_gap = timedelta(seconds=max_journey_gap_seconds)
-        self.active_journeys: Dict[str, Journey] = {}  # subscriber_key -> Journey
+        self.max_journey_gap_seconds = max_journey_gap_seconds
+        self.max_journey_gap_ns = max_journey_gap_seconds * 1_000_000_000
+        self.active_journeys: Dict[int, Journey] = {}  # subscriber code -> Journey
+        # First visit (cell code, ts, event name code) of subscribers not yet moving;
+        # a Journey is only created once a second cell is visited
+        self._pending_first: Dict[int, Tuple[int, int, int]] = {}
         self.completed_journeys: List[Journey] = []
+        self.on_journey_complete = on_journey_complete
+        self.keep_completed_journeys = keep_completed_journeys
         self.journey_counter = 0
+        # Running totals for get_journey_statistics, kept even when journeys are not
+        self._completed_count = 0
+        self._completed_visits = 0
+        self._completed_subscribers = set()
+        # Visits of completed journeys, and subscriber codes for the batch API
+        self._visits = _VisitStore()
+        self._subscribers = _StringPool()
     
-    def _create_journey_id(self, subscriber_key: str) -> str:
+    def _create_journey_id(self) -> int:
         """Generate a unique journey ID."""
         self.journey_counter += 1
-        return f"{subscriber_key}_{self.journey_counter}_{int(datetime.now().timestamp())}"
+        return self.journey_counter
     
-    def process_event(self, event: Dict):
+    def process_event(self, event: Dict) -> bool:
         """
         Process an S1-SEE event and update journey tracking.
         
@@ -79,87 +391,300 @@ class JourneyTracker:
             },
             ...
         }
+        
+        Returns:
+            Whether the event carried a subscriber key and target cell (and was tracked)
         """
-        event_name = event.get("name", "")
-        subscriber_key = event.get("subscriber_key", "")
-        timestamp = event.get("ts", 0)
-        attributes = event.get("attributes", {})
+        gap_ns = self.max_journey_gap_ns
+        event_name, timestamp, subscriber_key, attributes = _event_fields(event)
         
         if not subscriber_key:
-            return
+            return False
         
-        # Extract cell IDs from attributes
-        target_cell_id = attributes.get("target_cell_id") or attributes.get("cell_id")
-        source_cell_id = attributes.get("source_cell_id")
+        # Extract the cell ID with the extractor for this event's schema
+        target_cell_id = _CELL_ID_EXTRACTORS.get(event_name, _extract_any_cell_id)(attributes)
         
         if not target_cell_id:
-            return
+            return False
         
-        # Convert timestamp from nanoseconds to datetime
-        event_time = datetime.fromtimestamp(timestamp / 1e9)
-        
-        # Check if we have an active journey for this subscriber
-        if subscriber_key in self.active_journeys:
-            journey = self.active_journeys[subscriber_key]
-            last_visit = journey.visits[-1]
-            last_visit_time = datetime.fromtimestamp(last_visit.timestamp / 1e9)
-            
-            # Check if this event is within the journey time window
-            time_gap = event_time - last_visit_time
-            
-            if time_gap > self.max_journey_gap:
+        # Check if we have an active journey for this subscriber (keyed by its int code)
+        sub = self._subscribers.intern(subscriber_key)
+        cell = self._visits.cells.intern(target_cell_id)
+        journey = self.active_journeys.get(sub)
+        if journey is not None:
+            # Check if this event is within the journey time window (end_time is the
+            # last visit's timestamp, so compare nanoseconds directly)
+            if timestamp - journey.end_time > gap_ns:
                 # Gap too large, start a new journey
-                self._complete_journey(subscriber_key)
-                self._start_new_journey(subscriber_key, target_cell_id, timestamp, event_name)
+                self._complete_journey(sub)
+                self._start_new_journey(sub, cell, timestamp, event_name)
             else:
                 # Continue existing journey
                 # Only add if it's a different cell
-                if target_cell_id != last_visit.cell_id:
-                    visit = CellVisit(
-                        cell_id=target_cell_id,
-                        timestamp=timestamp,
-                        event_name=event_name,
-                        subscriber_key=subscriber_key
-                    )
-                    journey.visits.append(visit)
+                cell_codes, timestamps, event_name_codes = journey._open
+                if cell != cell_codes[-1]:
+                    cell_codes.append(cell)
+                    timestamps.append(timestamp)
+                    event_name_codes.append(self._visits.event_names.intern(event_name))
                     journey.end_time = timestamp
-        else:
-            # Start a new journey
-            self._start_new_journey(subscriber_key, target_cell_id, timestamp, event_name)
-    
-    def _start_new_journey(self, subscriber_key: str, cell_id: str, timestamp: int, event_name: str):
-        """Start a new journey for a subscriber."""
-        journey_id = self._create_journey_id(subscriber_key)
-        visit = CellVisit(
-            cell_id=cell_id,
-            timestamp=timestamp,
-            event_name=event_name,
-            subscriber_key=subscriber_key
+            return True
+        
+        first = self._pending_first.get(sub)
+        if first is None or timestamp - first[1] > gap_ns:
+            # Start a new journey (a pending first visit it replaces had no movement)
+            self._start_new_journey(sub, cell, timestamp, event_name)
+        elif cell != first[0]:
+            # Second cell visited: the journey has movement, so create it
+            del self._pending_first[sub]
+            self.active_journeys[sub] = self._create_journey(
+                subscriber_key, [first[0], cell], [first[1], timestamp],
+                [first[2], self._visits.event_names.intern(event_name)]
+            )
+        return True
+    
+    def encode_events(self, events: Iterable[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Turn events into the integer arrays taken by process_events_batch.
+        
+        Events without a subscriber key or target cell are dropped, as in process_event.
+        events may be any iterable, e.g. iter_events_from_jsonl, and is read once.
+        
+        Returns:
+            Tuple of (timestamps, subscriber_ids, target_cells, event_name_ids)
+        """
+        intern_subscriber = self._subscribers.intern
+        intern_cell = self._visits.cells.intern
+        intern_event_name = self._visits.event_names.intern
+        extractor_for = _CELL_ID_EXTRACTORS.get
+        timestamps, subscriber_ids, target_cells, event_name_ids = [], [], [], []
+        
+        for event in events:
+            event_name, timestamp, subscriber_key, attributes = _event_fields(event)
+            if not subscriber_key:
+                continue
+            target_cell_id = extractor_for(event_name, _extract_any_cell_id)(attributes)
+            if not target_cell_id:
+                continue
+            timestamps.append(timestamp)
+            subscriber_ids.append(intern_subscriber(subscriber_key))
+            target_cells.append(intern_cell(target_cell_id))
+            event_name_ids.append(intern_event_name(event_name))
+        
+        return (np.array(timestamps, dtype=np.int64), np.array(subscriber_ids, dtype=np.int64),
+                np.array(target_cells, dtype=np.int64), np.array(event_name_ids, dtype=np.int64))
+    
+    def process_events(self, events: Iterable[Dict]) -> int:
+        """
+        Process events in batches; equivalent to process_event on each.
+        
+        Events are read and tracked _BATCH_EVENTS at a time, so with
+        keep_completed_journeys off, memory is bounded by one batch plus active journeys.
+        Without numba the batch kernel would run as plain Python, which is slower than
+        process_event, so events are then tracked one at a time.
+        
+        Returns:
+            Number of events that carried a subscriber key and target cell
+        """
+        if njit is None:
+            process_event = self.process_event
+            return sum(process_event(event) for event in events)
+        events = iter(events)
+        num_events = 0
+        while True:
+            # Encode straight from the stream, so event dicts are never held as a list
+            batch = islice(events, _BATCH_EVENTS)
+            first = next(batch, None)
+            if first is None:
+                return num_events
+            arrays = self.encode_events(chain((first,), batch))
+            self.process_events_batch(*arrays)
+            num_events += len(arrays[0])
+    
+    def process_events_batch(self, timestamps: np.ndarray, subscriber_ids: np.ndarray,
+                             target_cells: np.ndarray, event_name_ids: np.ndarray):
+        """
+        Process events given as parallel integer arrays (see encode_events).
+        
+        Journey assignment runs in a compiled kernel when numba is available; visits
+        are then handed to their journeys in one pass per batch.
+        
+        Args:
+            timestamps: Event times in nanoseconds
+            subscriber_ids: Subscriber codes from encode_events
+            target_cells: Target cell codes from encode_events
+            event_name_ids: Event name codes from encode_events
+        """
+        subscriber_keys = self._subscribers.values
+        
+        # Seed per-subscriber state from journeys still active from earlier calls, then
+        # from pending first visits, whose journey slots hold None
+        journeys: List[Optional[Journey]] = list(self.active_journeys.values())
+        n_active = len(journeys)
+        active_subs = list(self.active_journeys) + list(self._pending_first)
+        firsts: Dict[int, Tuple[int, int, int]] = {}  # journey index -> pending first visit
+        n_subs = len(subscriber_keys)
+        last_ts = np.zeros(n_subs, dtype=np.int64)
+        last_cell = np.full(n_subs, -1, dtype=np.int64)
+        journey_of = np.full(n_subs, -1, dtype=np.int64)
+        for idx, sub in enumerate(active_subs):
+            if idx < n_active:
+                last_ts[sub] = journeys[idx].end_time
+                last_cell[sub] = journeys[idx]._open[0][-1]
+            else:
+                first = firsts[idx] = self._pending_first[sub]
+                last_cell[sub], last_ts[sub] = first[0], first[1]
+                journeys.append(None)
+            journey_of[sub] = idx
+        n_existing = len(journeys)
+        
+        # Group events by subscriber (a stable sort keeps event order within each
+        # subscriber), so the kernel scans contiguous runs instead of hopping between
+        # subscribers' state
+        subscriber_ids = np.asarray(subscriber_ids, dtype=np.int64)
+        order = np.argsort(subscriber_ids, kind="stable")
+        visit_journey, closed = _track_kernel(
+            order, np.asarray(timestamps, dtype=np.int64), subscriber_ids,
+            np.asarray(target_cells, dtype=np.int64), last_ts, last_cell, journey_of,
+            n_existing, self.max_journey_gap_ns
         )
         
-        journey = Journey(
+        # Group visit rows by journey, keeping event order within each journey
+        rows = np.flatnonzero(visit_journey >= 0)
+        rows = rows[np.argsort(visit_journey[rows], kind="stable")]
+        row_journeys = visit_journey[rows]
+        bounds = np.flatnonzero(np.diff(row_journeys)) + 1
+        if len(rows):
+            group_starts = np.concatenate(([0], bounds)).tolist()
+            group_ends = np.concatenate((bounds, [len(rows)])).tolist()
+        else:
+            # No event added a visit (e.g. an empty batch): only state is written back
+            group_starts, group_ends = [], []
+        row_events = rows.tolist()
+        row_ts = np.asarray(timestamps)[rows].tolist()
+        row_subs = np.asarray(subscriber_ids)[rows].tolist()
+        row_cells = np.asarray(target_cells)[rows].tolist()
+        row_names = np.asarray(event_name_ids)[rows].tolist()
+        
+        opened = []  # (event of the second visit, journey index, subscriber, visits)
+        for journey_idx, a, b in zip(row_journeys[group_starts].tolist(), group_starts, group_ends):
+            if journey_idx >= n_existing:
+                journeys.append(None)  # New journeys appear in index order
+            journey = journeys[journey_idx]
+            if journey is not None:
+                cell_codes, visit_ts, event_name_codes = journey._open
+                cell_codes.extend(row_cells[a:b])
+                visit_ts.extend(row_ts[a:b])
+                event_name_codes.extend(row_names[a:b])
+                journey.end_time = row_ts[b - 1]
+                continue
+            first = firsts.get(journey_idx)
+            if first is not None:
+                opened.append((row_events[a], journey_idx, row_subs[a], [first[0]] + row_cells[a:b],
+                               [first[1]] + row_ts[a:b], [first[2]] + row_names[a:b]))
+            elif b - a >= 2:
+                opened.append((row_events[a + 1], journey_idx, row_subs[a], row_cells[a:b],
+                               row_ts[a:b], row_names[a:b]))
+            else:
+                firsts[journey_idx] = (row_cells[a], row_ts[a], row_names[a])
+        
+        # Create journeys that gained movement in the order their second visits arrived,
+        # which is when process_event would create them
+        opened.sort()
+        opened_at: Dict[int, int] = {}
+        for event_idx, journey_idx, sub, cell_codes, visit_ts, event_name_codes in opened:
+            journeys[journey_idx] = self._create_journey(
+                subscriber_keys[sub], cell_codes, visit_ts, event_name_codes
+            )
+            opened_at[journey_idx] = event_idx
+        
+        # Journeys closed by a time gap, in the order they were closed; closed pending
+        # first visits had no movement and are dropped
+        self._store_journeys([
+            journeys[idx] for idx in closed[closed >= 0].tolist() if journeys[idx] is not None
+        ])
+        
+        # Still-active journeys keep their original order, then the newly created ones
+        kept, created = [], []
+        self._pending_first = {}
+        subs = np.flatnonzero(journey_of >= 0)
+        for sub, idx in zip(subs.tolist(), journey_of[subs].tolist()):
+            if journeys[idx] is None:
+                self._pending_first[sub] = firsts[idx]
+            elif idx < n_active:
+                kept.append((idx, sub))
+            else:
+                created.append((opened_at[idx], sub, idx))
+        kept.sort()
+        created.sort()
+        self.active_journeys = {sub: journeys[idx] for idx, sub in kept}
+        self.active_journeys.update((sub, journeys[idx]) for _, sub, idx in created)
+    
+    def _start_new_journey(self, sub: int, cell: int, timestamp: int, event_name: str):
+        """Record a subscriber's first visit; its Journey is created on the next cell change."""
+        self._pending_first[sub] = (cell, timestamp, self._visits.event_names.intern(event_name))
+    
+    def _create_journey(self, subscriber_key: str, cell_codes: List[int], timestamps: List[int],
+                        event_name_codes: List[int]) -> Journey:
+        """Create an active journey from its buffered visits."""
+        return Journey(
             subscriber_key=subscriber_key,
-            visits=[visit],
-            start_time=timestamp,
-            end_time=timestamp,
-            journey_id=journey_id
+            start_time=timestamps[0],
+            end_time=timestamps[-1],
+            journey_id=self._create_journey_id(),
+            _store=self._visits,
+            _open=(cell_codes, timestamps, event_name_codes)
         )
+    
+    def _complete_journey(self, sub: int):
+        """Mark a subscriber's active journey as completed."""
+        journey = self.active_journeys.pop(sub, None)
+        # Only save journeys with at least 2 visits (movement)
+        if journey is not None and journey.num_visits >= 2:
+            self._store_journeys([journey])
+    
+    def _store_journeys(self, journeys: List[Journey]):
+        """
+        Move the buffered visits of finished journeys into the visit store and save them.
         
-        self.active_journeys[subscriber_key] = journey
+        Journeys that are not kept stay buffered, so they are freed once the
+        on_journey_complete hook is done with them.
+        """
+        if not journeys:
+            return
+        if not self.keep_completed_journeys:
+            self._finish_journeys(journeys)
+            return
+        start = self._visits.extend(
+            list(chain.from_iterable(journey._open[0] for journey in journeys)),
+            list(chain.from_iterable(journey._open[1] for journey in journeys)),
+            list(chain.from_iterable(journey._open[2] for journey in journeys))
+        )
+        for journey in journeys:
+            journey._start = start
+            start += len(journey._open[0])
+            journey._end = start
+            journey._open = None
+        self._finish_journeys(journeys)
     
-    def _complete_journey(self, subscriber_key: str):
-        """Mark a journey as completed."""
-        if subscriber_key in self.active_journeys:
-            journey = self.active_journeys[subscriber_key]
-            # Only save journeys with at least 2 visits (movement)
-            if len(journey.visits) >= 2:
-                self.completed_journeys.append(journey)
-            del self.active_journeys[subscriber_key]
+    def _finish_journeys(self, journeys: List[Journey]):
+        """Count completed journeys, keep them if configured and pass them to the hook."""
+        self._completed_count += len(journeys)
+        self._completed_visits += sum(journey.num_visits for journey in journeys)
+        self._completed_subscribers.update(journey.subscriber_key for journey in journeys)
+        if self.keep_completed_journeys:
+            self.completed_journeys.extend(journeys)
+        if self.on_journey_complete is not None:
+            for journey in journeys:
+                self.on_journey_complete(journey)
     
     def complete_all_journeys(self):
         """Complete all active journeys (call this at the end of processing)."""
-        for subscriber_key in list(self.active_journeys.keys()):
-            self._complete_journey(subscriber_key)
+        self._store_journeys([
+            journey for journey in self.active_journeys.values() if journey.num_visits >= 2
+        ])
+        self.active_journeys.clear()
+        # Pending first visits never moved, so there is nothing to save
+        self._pending_first.clear()
     
     def get_completed_journeys(self) -> List[Journey]:
         """Get all completed journeys."""
@@ -167,7 +692,7 @@ class JourneyTracker:
     
     def get_journey_statistics(self) -> Dict:
         """Get statistics about tracked journeys."""
-        if not self.completed_journeys:
+        if not self._completed_count:
             return {
                 "total_journeys": 0,
                 "total_visits": 0,
@@ -175,29 +700,49 @@ class JourneyTracker:
                 "unique_subscribers": 0
             }
         
-        total_visits = sum(len(j.visits) for j in self.completed_journeys)
-        unique_subscribers = len(set(j.subscriber_key for j in self.completed_journeys))
-        
         return {
-            "total_journeys": len(self.completed_journeys),
-            "total_visits": total_visits,
-            "avg_journey_length": total_visits / len(self.completed_journeys),
-            "unique_subscribers": unique_subscribers
+            "total_journeys": self._completed_count,
+            "total_visits": self._completed_visits,
+            "avg_journey_length": self._completed_visits / self._completed_count,
+            "unique_subscribers": len(self._completed_subscribers)
         }
 
 
+def _parse_event_line(line: memoryview) -> Optional[Dict]:
+    """Parse one JSONL line, returning None for blank lines and reporting bad ones."""
+    try:
+        if orjson is not None:
+            return orjson.loads(line)
+        return json.loads(bytes(line))
+    except json.JSONDecodeError as e:  # orjson.JSONDecodeError is a subclass
+        if bytes(line).strip():
+            print(f"Warning: Failed to parse line: {e}")
+        return None
+
+
+def iter_events_from_jsonl(file_path: str) -> Iterator[Dict]:
+    """Yield events from a JSONL file (S1-SEE output format) one at a time."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # Scan the mapped file for line breaks; lines are parsed straight from the mapping
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            start = 0
+            end = len(mm)
+            while start < end:
+                nl = mm.find(b'\n', start)
+                if nl < 0:
+                    nl = end  # Final line without a trailing newline
+                if nl > start:
+                    event = _parse_event_line(view[start:nl])
+                    if event is not None:
+                        yield event
+                start = nl + 1
+
+
 def load_events_from_jsonl(file_path: str) -> List[Dict]:
     """Load events from a JSONL file (S1-SEE output format)."""
-    events = []
-    with open(file_path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line:
-                try:
-                    events.append(json.loads(line))
-                except json.JSONDecodeError as e:
-                    print(f"Warning: Failed to parse line: {e}")
-    return events
+    return list(iter_events_from_jsonl(file_path))
 
 
 if __name__ == "__main__":
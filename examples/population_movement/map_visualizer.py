@@ -13,6 +13,10 @@ from aggregator import JourneyAggregator, SegmentFlow, CellFlow
 import folium
 from folium import plugins
 import math
+import numpy as np
+
+# Decimal places kept in emitted segment coordinates (about 11 cm at 6)
+_COORD_DECIMALS = 6
 
 
 class MapVisualizer:
@@ -81,26 +85,23 @@ class MapVisualizer:
         if not cells:
             return (51.5074, -0.1278)  # Default to London
         
-        latitudes = []
-        longitudes = []
-        
-        for cell_flow in cells:
-            location = self.cell_db.get_cell_location(cell_flow.cell_id)
-            if location:
-                latitudes.append(location[0])
-                longitudes.append(location[1])
-        
-        if not latitudes:
+        # (N, 2) array of (lat, lon); cells without a known location are NaN rows
+        locations = self.cell_db.get_cell_locations([c.cell_id for c in cells])
+        locations = locations[~np.isnan(locations).any(axis=1)]
+        if not len(locations):
             return (51.5074, -0.1278)
         
-        return (sum(latitudes) / len(latitudes), sum(longitudes) / len(longitudes))
+        center_lat, center_lon = locations.mean(axis=0).tolist()
+        return (center_lat, center_lon)
     
     def _add_cell_sites(self, m: folium.Map, aggregator: JourneyAggregator):
-        """Add cell site markers to the map."""
+        """Add cell site markers to the map as a single GeoJSON layer."""
         cells = aggregator.get_all_cells()
+        locations = self.cell_db.get_locations_bulk([c.cell_id for c in cells])
+        features = []
         
         for cell_flow in cells:
-            location = self.cell_db.get_cell_location(cell_flow.cell_id)
+            location = locations.get(cell_flow.cell_id)
             if not location:
                 continue
             
@@ -119,46 +120,74 @@ class MapVisualizer:
             else:
                 color = 'blue'
             
-            # Create popup with cell information
-            popup_html = f"""
-            <div style="width: 200px;">
-                <h4>Cell Site: {cell_flow.cell_id}</h4>
-                <p><b>Cell Name:</b> {cell_info.get('cell_name', 'N/A') if cell_info else 'N/A'}</p>
-                <p><b>Total Entries:</b> {cell_flow.total_entries}</p>
-                <p><b>Total Exits:</b> {cell_flow.total_exits}</p>
-                <p><b>Unique Subscribers:</b> {len(cell_flow.unique_subscribers)}</p>
-            </div>
-            """
-            
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=marker_size,
-                popup=folium.Popup(popup_html, max_width=300),
-                color=color,
-                fill=True,
-                fillColor=color,
-                fillOpacity=0.6,
-                weight=2
-            ).add_to(m)
+            # Popup fields and marker style travel as feature properties
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {
+                    "cell_id": cell_flow.cell_id,
+                    "cell_name": cell_info.get('cell_name', 'N/A') if cell_info else 'N/A',
+                    "total_entries": cell_flow.total_entries,
+                    "total_exits": cell_flow.total_exits,
+                    "unique_subscribers": len(cell_flow.unique_subscribers),
+                    "color": color,
+                    "radius": marker_size,
+                },
+            })
+        
+        if not features:
+            return
+        
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            name="Cell sites",
+            marker=folium.CircleMarker(),
+            style_function=lambda feature: {
+                "radius": feature["properties"]["radius"],
+                "color": feature["properties"]["color"],
+                "fill": True,
+                "fillColor": feature["properties"]["color"],
+                "fillOpacity": 0.6,
+                "weight": 2,
+            },
+            popup=folium.GeoJsonPopup(
+                fields=["cell_id", "cell_name", "total_entries", "total_exits", "unique_subscribers"],
+                aliases=["Cell Site", "Cell Name", "Total Entries", "Total Exits", "Unique Subscribers"],
+                max_width=300
+            )
+        ).add_to(m)
     
     def _add_movement_segments(self, m: folium.Map, aggregator: JourneyAggregator):
-        """Add lines showing movement between cell sites."""
+        """Add lines showing movement between cell sites as a single GeoJSON layer."""
         segments = aggregator.get_all_segments()
+        locations = self.cell_db.get_locations_bulk(
+            cell_id for s in segments for cell_id in (s.from_cell, s.to_cell)
+        )
+        # Quantized [lon, lat] per cell, rounded once rather than per segment
+        points = {
+            cell_id: [round(location[1], _COORD_DECIMALS), round(location[0], _COORD_DECIMALS)]
+            for cell_id, location in locations.items() if location
+        }
+        features = []
         
         # Sort by journey count for layering (most traveled on top)
         sorted_segments = sorted(segments, key=lambda x: x.journey_count)
         
+        # Busiest segment, computed once: the list is sorted ascending
+        max_journeys = sorted_segments[-1].journey_count if sorted_segments else 1
+        inv_max = 1.0 / max_journeys
+        
         for segment_flow in sorted_segments:
-            from_location = self.cell_db.get_cell_location(segment_flow.from_cell)
-            to_location = self.cell_db.get_cell_location(segment_flow.to_cell)
+            start = points.get(segment_flow.from_cell)
+            end = points.get(segment_flow.to_cell)
             
-            if not from_location or not to_location:
+            if start is None or end is None:
                 continue
             
             # Calculate line width and opacity based on journey count
-            max_journeys = max(s.journey_count for s in segments) if segments else 1
-            width = max(1, min(10, (segment_flow.journey_count / max_journeys) * 10))
-            opacity = min(1.0, 0.3 + (segment_flow.journey_count / max_journeys) * 0.7)
+            share = segment_flow.journey_count * inv_max
+            width = round(max(1, min(10, share * 10)), 2)
+            opacity = round(min(1.0, 0.3 + share * 0.7), 3)
             
             # Color based on journey count
             if segment_flow.journey_count > max_journeys * 0.7:
@@ -168,34 +197,50 @@ class MapVisualizer:
             else:
                 color = 'blue'
             
-            # Create popup
-            popup_html = f"""
-            <div style="width: 200px;">
-                <h4>Movement Segment</h4>
-                <p><b>From:</b> {segment_flow.from_cell}</p>
-                <p><b>To:</b> {segment_flow.to_cell}</p>
-                <p><b>Journeys:</b> {segment_flow.journey_count}</p>
-                <p><b>Subscribers:</b> {segment_flow.subscriber_count}</p>
-            </div>
-            """
-            
-            folium.PolyLine(
-                locations=[[from_location[0], from_location[1]],
-                          [to_location[0], to_location[1]]],
-                weight=width,
-                color=color,
-                opacity=opacity,
-                popup=folium.Popup(popup_html, max_width=300),
-                tooltip=f"{segment_flow.journey_count} journeys"
-            ).add_to(m)
+            # Every segment keeps its own line, so popups show its exact counts; movement
+            # between co-sited cells is a zero-length line, drawn as a dot by the round caps
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [start, end]},
+                "properties": {
+                    "from_cell": segment_flow.from_cell,
+                    "to_cell": segment_flow.to_cell,
+                    "journey_count": segment_flow.journey_count,
+                    "subscriber_count": segment_flow.subscriber_count,
+                    "tooltip": f"{segment_flow.journey_count} journeys",
+                    "color": color,
+                    "weight": width,
+                    "opacity": opacity,
+                },
+            })
+        
+        if not features:
+            return
+        
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            name="Movement segments",
+            style_function=lambda feature: {
+                "color": feature["properties"]["color"],
+                "weight": feature["properties"]["weight"],
+                "opacity": feature["properties"]["opacity"],
+            },
+            popup=folium.GeoJsonPopup(
+                fields=["from_cell", "to_cell", "journey_count", "subscriber_count"],
+                aliases=["From", "To", "Journeys", "Subscribers"],
+                max_width=300
+            ),
+            tooltip=folium.GeoJsonTooltip(fields=["tooltip"], labels=False)
+        ).add_to(m)
     
     def _add_heatmap(self, m: folium.Map, aggregator: JourneyAggregator):
         """Add a heatmap layer showing cell site activity."""
         heat_data = []
         
         cells = aggregator.get_all_cells()
+        locations = self.cell_db.get_locations_bulk([c.cell_id for c in cells])
         for cell_flow in cells:
-            location = self.cell_db.get_cell_location(cell_flow.cell_id)
+            location = locations.get(cell_flow.cell_id)
             if location:
                 # Weight based on total traffic
                 weight = cell_flow.total_entries + cell_flow.total_exits
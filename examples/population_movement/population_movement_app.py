@@ -17,41 +17,39 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from cell_site_db import CellSiteDB, init_sample_cell_sites
-from journey_tracker import JourneyTracker, load_events_from_jsonl
+from journey_tracker import JourneyTracker, iter_events_from_jsonl
 from aggregator import JourneyAggregator
 from map_visualizer import MapVisualizer
 
 
 def process_events(events_file: str, cell_db: CellSiteDB,
-                  max_journey_gap_seconds: int = 3600) -> tuple:
+                  max_journey_gap_seconds: int = 3600,
+                  on_journey_complete=None) -> tuple:
     """
     Process events from S1-SEE and track journeys.
     
+    If on_journey_complete is given, completed journeys are passed to it and not kept.
+    
     Returns:
         Tuple of (journey_tracker, completed_journeys)
     """
-    print(f"Loading events from {events_file}...")
-    events = load_events_from_jsonl(events_file)
-    print(f"Loaded {len(events)} events")
-    
     # Initialize journey tracker
-    tracker = JourneyTracker(max_journey_gap_seconds=max_journey_gap_seconds)
+    tracker = JourneyTracker(max_journey_gap_seconds=max_journey_gap_seconds,
+                             on_journey_complete=on_journey_complete,
+                             keep_completed_journeys=on_journey_complete is None)
     
-    # Process each event
-    print("Processing events and tracking journeys...")
-    for i, event in enumerate(events):
-        if (i + 1) % 100 == 0:
-            print(f"  Processed {i + 1}/{len(events)} events...")
-        tracker.process_event(event)
+    # Stream events from the file in bounded batches, without holding every event dict
+    print(f"Processing events from {events_file} and tracking journeys...")
+    num_events = tracker.process_events(iter_events_from_jsonl(events_file))
+    print(f"Processed {num_events} events")
     
     # Complete all active journeys
     tracker.complete_all_journeys()
     journeys = tracker.get_completed_journeys()
     
-    print(f"Tracked {len(journeys)} completed journeys")
-    
     # Print statistics
     stats = tracker.get_journey_statistics()
+    print(f"Tracked {stats['total_journeys']} completed journeys")
     print(f"\nJourney Statistics:")
     print(f"  Total journeys: {stats['total_journeys']}")
     print(f"  Total visits: {stats['total_visits']}")
@@ -68,6 +66,12 @@ def aggregate_journeys(journeys, cell_db: CellSiteDB) -> JourneyAggregator:
     aggregator = JourneyAggregator()
     aggregator.aggregate_journeys(journeys)
     
+    print_aggregation_statistics(aggregator)
+    return aggregator
+
+
+def print_aggregation_statistics(aggregator: JourneyAggregator):
+    """Print aggregation statistics and the most traveled segments."""
     stats = aggregator.get_statistics()
     print(f"\nAggregation Statistics:")
     print(f"  Unique segments: {stats['total_unique_segments']}")
@@ -88,8 +92,6 @@ def aggregate_journeys(journeys, cell_db: CellSiteDB) -> JourneyAggregator:
         for i, segment in enumerate(top_segments, 1):
             print(f"  {i}. {segment.from_cell} → {segment.to_cell}: "
                   f"{segment.journey_count} journeys, {segment.subscriber_count} subscribers")
-    
-    return aggregator
 
 
 def create_visualization(aggregator: JourneyAggregator, cell_db: CellSiteDB,
@@ -137,6 +139,11 @@ def main():
         default=3600,
         help="Maximum time gap (seconds) between visits to consider same journey (default: 3600)"
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Aggregate journeys as they complete instead of keeping them all in memory"
+    )
     parser.add_argument(
         "--center-lat",
         type=float,
@@ -182,16 +189,25 @@ def main():
         print(f"Found {len(all_cells)} cell sites in database")
     
     try:
-        # Process events
-        tracker, journeys = process_events(args.events, cell_db, args.max_journey_gap)
+        # Process events, aggregating each journey as it completes when streaming
+        streaming_aggregator = JourneyAggregator() if args.stream else None
+        tracker, journeys = process_events(
+            args.events, cell_db, args.max_journey_gap,
+            on_journey_complete=streaming_aggregator.ingest_journey if args.stream else None
+        )
         
-        if not journeys:
+        if not tracker.get_journey_statistics()["total_journeys"]:
             print("Warning: No journeys were tracked from the events.")
             print("  Make sure the events contain mobility events with cell_id attributes.")
             sys.exit(1)
         
         # Aggregate journeys
-        aggregator = aggregate_journeys(journeys, cell_db)
+        if streaming_aggregator is not None:
+            print("\nAggregated journeys as they completed")
+            aggregator = streaming_aggregator
+            print_aggregation_statistics(aggregator)
+        else:
+            aggregator = aggregate_journeys(journeys, cell_db)
         
         # Create visualization
         create_visualization(aggregator, cell_db, args.output)
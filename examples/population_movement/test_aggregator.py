@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Tests for the journey aggregator's aggregation paths.
+
+Run with: python -m pytest test_aggregator.py (or python -m unittest)
+"""
+
+import random
+import unittest
+from unittest import mock
+
+import aggregator
+from aggregator import JourneyAggregator, _Bitset
+from journey_tracker import JourneyTracker
+
+
+def _journeys(seed: int, n_cells: int, n_events: int = 3000, n_subscribers: int = 80):
+    """Completed journeys of one tracker fed random handovers."""
+    rnd = random.Random(seed)
+    tracker = JourneyTracker(max_journey_gap_seconds=600)
+    ts = 0
+    for _ in range(n_events):
+        ts += rnd.randint(0, 60) * 1_000_000_000
+        tracker.process_event({
+            "name": "Mobility.Handover.Notified",
+            "ts": ts,
+            "subscriber_key": f"IMSI:{rnd.randint(1, n_subscribers)}",
+            "attributes": {"target_cell_id": f"CELL:{rnd.randint(1, n_cells)}"},
+        })
+    tracker.complete_all_journeys()
+    return tracker.get_completed_journeys()
+
+
+def _expected(journeys):
+    """Segment rows and cell flows computed directly from the journeys' paths."""
+    segments = {}  # (from, to) -> [journeys, subscribers, first_seen, last_seen], first-seen order
+    cells = {}  # cell -> [entries, exits, subscribers, entry counts, exit counts]
+    for journey in journeys:
+        for from_cell, to_cell in journey.get_segments():
+            row = segments.setdefault((from_cell, to_cell), [0, set(), journey.start_time, journey.end_time])
+            row[0] += 1
+            row[1].add(journey.subscriber_key)
+            row[2] = min(row[2], journey.start_time)
+            row[3] = max(row[3], journey.end_time)
+            for cell, slot in ((to_cell, 0), (from_cell, 1)):
+                flow = cells.setdefault(cell, [0, 0, set(), {}, {}])
+                flow[slot] += 1
+                flow[2].add(journey.subscriber_key)
+                counts = flow[3 + slot]
+                counts[(from_cell, to_cell)] = counts.get((from_cell, to_cell), 0) + 1
+    segment_rows = [(f, t, n, len(subs), first, last) for (f, t), (n, subs, first, last) in segments.items()]
+    cell_flows = {cell: (entries, exits, subs, entry_counts, exit_counts)
+                  for cell, (entries, exits, subs, entry_counts, exit_counts) in cells.items()}
+    return segment_rows, cell_flows
+
+
+def _snapshot(agg: JourneyAggregator):
+    """Segment rows and cell flows of an aggregator, as plain values."""
+    segment_rows = [(s.from_cell, s.to_cell, s.journey_count, s.subscriber_count, s.first_seen, s.last_seen)
+                    for s in agg.get_all_segments()]
+    subscriber_keys = list(agg._sub_id)
+    cell_flows = {
+        flow.cell_id: (
+            flow.total_entries,
+            flow.total_exits,
+            {subscriber_keys[sub_id] for sub_id in flow.unique_subscribers},
+            {agg._key_to_cells(key): count for key, count in flow.entry_counts.items()},
+            {agg._key_to_cells(key): count for key, count in flow.exit_counts.items()},
+        )
+        for flow in agg.get_all_cells()
+    }
+    return segment_rows, cell_flows
+
+
+def _aggregate(journeys, use_numba: bool = True, use_pandas: bool = True) -> JourneyAggregator:
+    """aggregate_journeys with the optional numba kernel and pandas path switched off as asked."""
+    patches = []
+    if not use_numba:
+        patches.append(mock.patch.object(aggregator, "njit", None))
+    if not use_pandas:
+        patches.append(mock.patch.object(aggregator, "pd", None))
+    agg = JourneyAggregator()
+    for patch in patches:
+        patch.start()
+    try:
+        agg.aggregate_journeys(journeys)
+    finally:
+        for patch in patches:
+            patch.stop()
+    return agg
+
+
+def _ingest(journeys) -> JourneyAggregator:
+    agg = JourneyAggregator()
+    for journey in journeys:
+        agg.ingest_journey(journey)
+    return agg
+
+
+class AggregationPathsTest(unittest.TestCase):
+
+    def assert_paths_match(self, journeys):
+        expected = _expected(journeys)
+        paths = {
+            "python": _aggregate(journeys, use_numba=False, use_pandas=False),
+            "default": _aggregate(journeys),
+            "ingest_journey": _ingest(journeys),
+        }
+        if aggregator.njit is not None:
+            paths["numba"] = _aggregate(journeys, use_pandas=False)
+        if aggregator.pd is not None:
+            paths["pandas"] = _aggregate(journeys, use_numba=False)
+        reference = paths["python"]
+        for name, agg in paths.items():
+            with self.subTest(path=name):
+                self.assertEqual(_snapshot(agg), expected)
+                self.assertEqual(agg.get_statistics(), reference.get_statistics())
+                for limit in (1, 3, 10, 1000):
+                    self.assertEqual(agg.get_top_segments(limit), reference.get_top_segments(limit))
+
+    def test_paths_match(self):
+        for seed in range(3):
+            self.assert_paths_match(_journeys(seed, n_cells=6))
+
+    def test_paths_match_beyond_kernel_cell_limit(self):
+        journeys = _journeys(0, n_cells=aggregator._KERNEL_MAX_CELLS + 500, n_events=20000, n_subscribers=300)
+        self.assertGreater(len({cell for j in journeys for cell in j.get_path()}), aggregator._KERNEL_MAX_CELLS)
+        self.assert_paths_match(journeys)
+
+    def test_journeys_from_several_trackers(self):
+        # Trackers number cells independently, so codes must not be shared blindly
+        self.assert_paths_match(_journeys(1, n_cells=5) + _journeys(2, n_cells=8))
+
+    def test_no_journeys(self):
+        for agg in (_aggregate([]), _aggregate([], use_numba=False, use_pandas=False), _ingest([])):
+            self.assertEqual(agg.get_all_segments(), [])
+            self.assertEqual(agg.get_top_segments(), [])
+            self.assertEqual(agg.get_statistics()["total_unique_segments"], 0)
+
+    def test_top_segments_break_ties_in_first_seen_order(self):
+        agg = _aggregate(_journeys(3, n_cells=5))
+        segments = agg.get_all_segments()
+        ranked = sorted(segments, key=lambda s: -s.journey_count)  # Stable: ties keep row order
+        self.assertLess(len({s.journey_count for s in segments}), len(segments))
+        for limit in range(1, len(segments) + 2):
+            self.assertEqual(agg.get_top_segments(limit), ranked[:limit])
+
+    def test_statistics(self):
+        journeys = _journeys(4, n_cells=6)
+        stats = _aggregate(journeys).get_statistics()
+        segment_rows, cell_flows = _expected(journeys)
+        total = sum(row[2] for row in segment_rows)
+        self.assertEqual(stats["total_unique_segments"], len(segment_rows))
+        self.assertEqual(stats["total_cells"], len(cell_flows))
+        self.assertEqual(stats["total_journey_segments"], total)
+        self.assertAlmostEqual(stats["avg_journeys_per_segment"], total / len(segment_rows))
+        self.assertEqual(stats["most_traveled_segment"]["journey_count"], max(row[2] for row in segment_rows))
+
+    def test_ingest_after_aggregate_raises_without_changes(self):
+        journeys = _journeys(5, n_cells=6)
+        agg = _aggregate(journeys)
+        before = _snapshot(agg), agg.get_statistics()
+        with self.assertRaises(ValueError):
+            agg.ingest_journey(journeys[0])
+        self.assertEqual((_snapshot(agg), agg.get_statistics()), before)
+
+
+class BitsetTest(unittest.TestCase):
+
+    def test_matches_set(self):
+        rnd = random.Random(0)
+        ids = [rnd.randint(0, 5000) for _ in range(2000)]
+        bits = _Bitset(ids[:1000])
+        bits.update(ids[1000:])
+        self.assertEqual(list(bits), sorted(set(ids)))
+        self.assertEqual(len(bits), len(set(ids)))
+        for i in range(5100):
+            self.assertEqual(i in bits, i in set(ids))
+
+
+if __name__ == "__main__":
+    unittest.main()
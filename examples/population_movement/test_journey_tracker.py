@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the journey tracker's batch processing.
+
+Run with: python -m pytest test_journey_tracker.py (or python -m unittest)
+"""
+
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import journey_tracker
+from journey_tracker import CellVisit, Journey, JourneyTracker, iter_events_from_jsonl
+
+
+def _event(subscriber_key: str, ts: int, cell_id: str, name: str = "Mobility.Handover.Notified"):
+    return {"name": name, "ts": ts, "subscriber_key": subscriber_key,
+            "attributes": {"target_cell_id": cell_id}}
+
+
+def _snapshot(tracker: JourneyTracker):
+    """Completed and active journeys, plus pending first visits, as plain values."""
+    completed = [(j.journey_id, j.subscriber_key, j.get_path(), j.start_time, j.end_time)
+                 for j in tracker.completed_journeys]
+    active = [(sub, j.journey_id, j.get_path(), j.end_time) for sub, j in tracker.active_journeys.items()]
+    return completed, active, dict(tracker._pending_first)
+
+
+class ProcessEventsBatchTest(unittest.TestCase):
+
+    def test_empty_batch(self):
+        tracker = JourneyTracker()
+        self.assertEqual(tracker.process_events([]), 0)
+        tracker.complete_all_journeys()
+        self.assertEqual(tracker.get_completed_journeys(), [])
+
+    def test_batch_without_mobility_events(self):
+        tracker = JourneyTracker()
+        events = [{"name": "Session.Started", "ts": 1, "subscriber_key": "IMSI:1", "attributes": {}},
+                  {"name": "Mobility.Handover.Notified", "ts": 2, "subscriber_key": "", "attributes": {}}]
+        self.assertEqual(tracker.process_events(events), 0)
+        self.assertEqual(tracker.get_journey_statistics()["total_journeys"], 0)
+
+    def test_empty_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as f:
+            path = f.name
+        try:
+            tracker = JourneyTracker()
+            self.assertEqual(tracker.process_events(iter_events_from_jsonl(path)), 0)
+        finally:
+            os.unlink(path)
+
+    def test_batch_without_visit_rows_keeps_state(self):
+        # A batch that only repeats the current cell adds no visits but must keep
+        # the active journey and the pending first visit
+        tracker = JourneyTracker()
+        tracker.process_events([_event("IMSI:1", 1, "A"), _event("IMSI:1", 2, "B"), _event("IMSI:2", 3, "C")])
+        before = _snapshot(tracker)
+        self.assertEqual(tracker.process_events([_event("IMSI:1", 4, "B"), _event("IMSI:2", 5, "C")]), 2)
+        self.assertEqual(_snapshot(tracker), before)
+
+    def test_batches_match_per_event_processing(self):
+        for seed in range(20):
+            rnd = random.Random(seed)
+            events = []
+            ts = 0
+            for _ in range(300):
+                ts += rnd.randint(0, 400) * 1_000_000_000
+                events.append(_event(f"IMSI:{rnd.randint(1, 12)}", ts, f"CELL:{rnd.randint(1, 4)}"))
+
+            expected = JourneyTracker(max_journey_gap_seconds=900)
+            for event in events:
+                expected.process_event(event)
+
+            batched = JourneyTracker(max_journey_gap_seconds=900)
+            i = 0
+            while i < len(events):
+                size = rnd.randint(0, 40)
+                batched.process_events(events[i:i + size])
+                i += size
+
+            self.assertEqual(_snapshot(batched), _snapshot(expected), f"seed {seed}")
+            expected.complete_all_journeys()
+            batched.complete_all_journeys()
+            self.assertEqual(_snapshot(batched), _snapshot(expected), f"seed {seed}")
+
+    def test_without_numba_tracks_event_by_event(self):
+        events = [_event("IMSI:1", 1, "A"), _event("IMSI:1", 2, "B"), _event("", 3, "A"),
+                  {"name": "Session.Started", "ts": 4, "subscriber_key": "IMSI:2", "attributes": {}}]
+        expected = JourneyTracker()
+        for event in events:
+            expected.process_event(event)
+        tracker = JourneyTracker()
+        with mock.patch.object(journey_tracker, "njit", None), \
+                mock.patch.object(tracker, "process_events_batch", side_effect=AssertionError):
+            self.assertEqual(tracker.process_events(iter(events)), 2)
+        self.assertEqual(_snapshot(tracker), _snapshot(expected))
+
+
+
+class JourneyTest(unittest.TestCase):
+
+    def test_from_visits_matches_tracked_journey(self):
+        tracker = JourneyTracker()
+        for ts, cell in ((1, "A"), (2, "B"), (3, "C")):
+            tracker.process_event(_event("IMSI:1", ts, cell))
+        tracker.complete_all_journeys()
+        tracked, = tracker.get_completed_journeys()
+        journey = Journey.from_visits(tracked.visits, journey_id=tracked.journey_id)
+        self.assertEqual(journey, tracked)
+        self.assertEqual(journey.visits, tracked.visits)
+        self.assertEqual(journey.get_path(), ["A", "B", "C"])
+        self.assertEqual(journey.get_segments(), [("A", "B"), ("B", "C")])
+
+    def test_requires_visits(self):
+        with self.assertRaises(ValueError):
+            Journey(subscriber_key="IMSI:1", start_time=1, end_time=2, journey_id=0)
+        with self.assertRaises(ValueError):
+            Journey.from_visits([])
+
+
+if __name__ == "__main__":
+    unittest.main()